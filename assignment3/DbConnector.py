@@ -1,4 +1,88 @@
+import importlib.util
+import json
+import os
+from pathlib import Path
+
 from pymongo import MongoClient
+from pymongo.read_concern import ReadConcern
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent / 'mongodb_config.json'
+
+DEFAULT_CONFIG = {
+    'host': '127.0.0.1',
+    'user': 'TEST_USER',
+    'password': 'test123',
+    'auth': True,
+    'auth_source': 'admin',
+    'max_pool_size': 50,
+    # Wire compression, in order of preference; the server picks the first it supports
+    'compressors': ['zstd', 'snappy', 'zlib'],
+    'connect_timeout_ms': 10000,
+    'socket_timeout_ms': None,
+    'server_selection_timeout_ms': 30000,
+    'batch_size': 10000,
+    'read_concern': 'local',
+    # WiredTiger block compressor for the large collections, None keeps the server default
+    'block_compressor': 'zstd',
+}
+
+# Environment variable -> (config key, parser)
+ENV_VARS = {
+    'MONGODB_HOST': ('host', str),
+    'MONGODB_USER': ('user', str),
+    'MONGODB_PASSWORD': ('password', str),
+    'MONGODB_AUTH': ('auth', lambda value: value.lower() in ('1', 'true', 'yes')),
+    'MONGODB_AUTH_SOURCE': ('auth_source', str),
+    'MONGODB_MAX_POOL_SIZE': ('max_pool_size', int),
+    'MONGODB_COMPRESSORS': ('compressors', lambda value: [c.strip() for c in value.split(',') if c.strip()]),
+    'MONGODB_CONNECT_TIMEOUT_MS': ('connect_timeout_ms', int),
+    'MONGODB_SOCKET_TIMEOUT_MS': ('socket_timeout_ms', int),
+    'MONGODB_SERVER_SELECTION_TIMEOUT_MS': ('server_selection_timeout_ms', int),
+    'MONGODB_BATCH_SIZE': ('batch_size', int),
+    'MONGODB_READ_CONCERN': ('read_concern', str),
+    'MONGODB_BLOCK_COMPRESSOR': ('block_compressor', lambda value: value or None),
+}
+
+# Python package pymongo needs for each wire compressor
+COMPRESSOR_MODULES = {
+    'zstd': 'zstandard',
+    'snappy': 'snappy',
+    'zlib': 'zlib',
+}
+
+
+def load_config(path=None):
+    """
+    Return the connection settings: DEFAULT_CONFIG, overridden by the JSON
+    config file (MONGODB_CONFIG or mongodb_config.json next to this file),
+    overridden by the MONGODB_* environment variables.
+    """
+    config = dict(DEFAULT_CONFIG)
+
+    path = Path(path or os.environ.get('MONGODB_CONFIG', DEFAULT_CONFIG_PATH))
+    if path.exists():
+        with open(path) as f:
+            config.update(json.load(f))
+
+    for env_var, (key, parse) in ENV_VARS.items():
+        if env_var in os.environ:
+            config[key] = parse(os.environ[env_var])
+
+    return config
+
+
+def available_compressors(compressors):
+    # Compressors whose package isn't installed would make MongoClient fail
+    return [c for c in compressors if importlib.util.find_spec(COMPRESSOR_MODULES.get(c, c)) is not None]
+
+
+def block_compression_options(block_compressor):
+    """
+    create_collection options for WiredTiger block compression, e.g. 'zstd'.
+    """
+    if not block_compressor:
+        return {}
+    return {'storageEngine': {'wiredTiger': {'configString': f"block_compressor={block_compressor}"}}}
 
 
 class DbConnector:
@@ -10,24 +94,47 @@ class DbConnector:
     HOST = "localhost" // Your local MongoDB Docker container
     USER = "TEST_USER" // This is the user you created and added privileges for
     PASSWORD = "test123" // The password you set for said user
+
+    Any argument left out is taken from load_config, which also sets the
+    pool size, compression, timeouts, batch size and read concern.
     """
     is_sepanta = False
 
     def __init__(self,
                  DATABASE='DATABASE_NAME',
-                 HOST="127.0.0.1",
-                 USER="TEST_USER",
-                 PASSWORD="test123"):
-        if self.is_sepanta:
+                 HOST=None,
+                 USER=None,
+                 PASSWORD=None,
+                 config=None):
+        self.config = config or load_config()
+        host = HOST or self.config['host']
+        user = USER or self.config['user']
+        password = PASSWORD or self.config['password']
+
+        if self.is_sepanta or not self.config['auth']:
             # Windows-compatible: No authentication for local development
-            uri = "mongodb://%s:27017/" % HOST
+            uri = "mongodb://%s:27017/" % host
         else:
             # Mac/Linux: With authentication
-            uri = "mongodb://%s:%s@%s/?authSource=admin" % (USER, PASSWORD, HOST)
+            uri = "mongodb://%s:%s@%s/?authSource=%s" % (user, password, host, self.config['auth_source'])
+
+        options = {
+            'maxPoolSize': self.config['max_pool_size'],
+            'connectTimeoutMS': self.config['connect_timeout_ms'],
+            'socketTimeoutMS': self.config['socket_timeout_ms'],
+            'serverSelectionTimeoutMS': self.config['server_selection_timeout_ms'],
+        }
+        compressors = available_compressors(self.config['compressors'])
+        if compressors:
+            options['compressors'] = compressors
+
+        self.batch_size = self.config['batch_size']
+        self.block_compressor = self.config['block_compressor']
+
         # Connect to the databases
         try:
-            self.client = MongoClient(uri)
-            self.db = self.client[DATABASE]
+            self.client = MongoClient(uri, **options)
+            self.db = self.client.get_database(DATABASE, read_concern=ReadConcern(self.config['read_concern']))
         except Exception as e:
             print("ERROR: Failed to connect to db:", e)
 
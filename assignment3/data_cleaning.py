@@ -1,8 +1,12 @@
+import argparse
 import ast
+import tempfile
+from itertools import chain
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+from ratings_io import iter_ratings, load_ratings_aggregate, read_ratings
 
 
 def clean_movies_runtime(df):
@@ -63,49 +67,29 @@ def clean_movies_runtime(df):
     if zero_runtime_mask.sum() > 0:
         print(f"Cleaning {zero_runtime_mask.sum()} movies with 0 runtime...")
 
-        if 'genres_list' not in cleaned_df.columns:
-            def extract_genres(genre_str):
-                try:
-                    genres = ast.literal_eval(genre_str)
-                    return [g['name'] for g in genres] if isinstance(genres, list) else []
-                except:
-                    return []
-            cleaned_df['genres_list'] = cleaned_df['genres'].apply(extract_genres)
-
-        genre_medians = {}
-        for genre_list in cleaned_df['genres_list']:
-            if genre_list:
-                for genre in genre_list:
-                    if genre not in genre_medians:
-                        genre_movies = cleaned_df[
-                            (cleaned_df['genres_list'].apply(lambda x: genre in x if x else False)) &
-                            (cleaned_df['runtime'] > 0)
-                        ]
-                        if not genre_movies.empty:
-                            genre_medians[genre] = genre_movies['runtime'].median()
-
-        for idx in cleaned_df[zero_runtime_mask].index:
-            movie_genres = cleaned_df.loc[idx, 'genres_list']
-            if movie_genres:
-                genre_runtimes = [genre_medians.get(genre, np.nan) for genre in movie_genres]
-                valid_runtimes = [rt for rt in genre_runtimes if not np.isnan(rt)]
-                if valid_runtimes:
-                    median_runtime = np.median(valid_runtimes)
-                    cleaned_df.loc[idx, 'runtime'] = median_runtime
+        # One exploded frame serves every genre instead of a full-frame scan per genre
+        exploded = cleaned_df[['genres_list', 'runtime']].explode('genres_list')
+        exploded = exploded[exploded['genres_list'].notna()]
+        genre_medians = exploded[exploded['runtime'] > 0].groupby('genres_list')['runtime'].median()
+
+        zero_genres = exploded[zero_runtime_mask.reindex(exploded.index)]
+        zero_genres = zero_genres.assign(genre_median=zero_genres['genres_list'].map(genre_medians))
+        # Median of the movie's genre medians, NaN when none of its genres has data
+        filled_runtimes = zero_genres.groupby(level=0)['genre_median'].median().dropna()
+
+        cleaned_df.loc[filled_runtimes.index, 'runtime'] = filled_runtimes
 
     return cleaned_df
 
 
-def fix_vote_counts(df, ratings_df, links_df):
+def fix_vote_counts(df, ratings_stats, links_df):
     print("\n" + "="*70)
     print("Calculating actual vote counts and averages from ratings...")
     print("="*70)
 
-    # Calculate both count and average rating per movieId
-    ratings_stats = ratings_df.groupby('movieId')['rating'].agg(['count', 'mean']).to_dict()
-    ratings_counts = ratings_stats['count']
-    ratings_averages = ratings_stats['mean']
-    print(f"Calculated vote counts and averages for {len(ratings_counts)} unique movieIds")
+    # Count and rating sum per movieId, so duplicates can be combined as a weighted average
+    ratings_stats = ratings_stats[['count', 'sum']]
+    print(f"Calculated vote counts and averages for {len(ratings_stats)} unique movieIds")
 
     links_df_converted = links_df.copy()
     links_df_converted['tmdbId'] = pd.to_numeric(links_df_converted['tmdbId'], errors='coerce')
@@ -115,65 +99,38 @@ def fix_vote_counts(df, ratings_df, links_df):
     links_df_converted['movieId'] = links_df_converted['movieId'].astype(int)
     print(f"Mapped vote counts for {len(links_df_converted)} unique tmdbIds")
 
-    vote_counts = {}
-    vote_averages = {}
-    for _, link_row in links_df_converted.iterrows():
-        tmdb_id = link_row['tmdbId']
-        movie_id = link_row['movieId']
-
-        if movie_id in ratings_counts:
-            if tmdb_id in vote_counts:
-                # For duplicates, we need to weighted average
-                old_count = vote_counts[tmdb_id]
-                old_avg = vote_averages[tmdb_id]
-                new_count = ratings_counts[movie_id]
-                new_avg = ratings_averages[movie_id]
-
-                total_count = old_count + new_count
-                weighted_avg = (old_avg * old_count + new_avg * new_count) / total_count
-
-                vote_counts[tmdb_id] = total_count
-                vote_averages[tmdb_id] = weighted_avg
-            else:
-                vote_counts[tmdb_id] = ratings_counts[movie_id]
-                vote_averages[tmdb_id] = ratings_averages[movie_id]
-
-    print(f"Mapped vote counts and averages for {len(vote_counts)} movies (tmdbId -> movieId -> ratings)")
-
-    df['id_int'] = pd.to_numeric(df['id'], errors='coerce').astype('Int64')
+    votes_by_tmdb = (
+        links_df_converted[['tmdbId', 'movieId']]
+        .merge(ratings_stats, left_on='movieId', right_index=True, how='inner')
+        .groupby('tmdbId')[['count', 'sum']]
+        .sum()
+    )
+    votes_by_tmdb['average'] = votes_by_tmdb['sum'] / votes_by_tmdb['count']
 
-    correct_count = 0
-    incorrect_count = 0
-    missing_count = 0
-    not_in_ratings = 0
+    print(f"Mapped vote counts and averages for {len(votes_by_tmdb)} movies (tmdbId -> movieId -> ratings)")
 
     df['vote_count'] = pd.to_numeric(df['vote_count'], errors='coerce')
     df['vote_average'] = pd.to_numeric(df['vote_average'], errors='coerce')
 
-    for idx, row in df.iterrows():
-        tmdb_id = row['id_int']
+    id_int = pd.to_numeric(df['id'], errors='coerce').astype('Int64')
+    actual_count = id_int.map(votes_by_tmdb['count']).astype('float64')
+    actual_average = id_int.map(votes_by_tmdb['average']).astype('float64')
 
-        if pd.isna(tmdb_id):
-            missing_count += 1
-            continue
+    missing_mask = id_int.isna()
+    in_ratings_mask = actual_count.notna()
+    not_in_ratings_mask = ~missing_mask & ~in_ratings_mask
 
-        if tmdb_id in vote_counts:
-            actual_count = vote_counts[tmdb_id]
-            actual_average = vote_averages[tmdb_id]
-            csv_count = row['vote_count']
+    correct_mask = in_ratings_mask & (np.trunc(df['vote_count']) == actual_count)
+    incorrect_mask = in_ratings_mask & ~correct_mask
 
-            if pd.notna(csv_count) and int(csv_count) == actual_count:
-                correct_count += 1
-            else:
-                incorrect_count += 1
-                df.at[idx, 'vote_count'] = actual_count
-                df.at[idx, 'vote_average'] = actual_average
-        else:
-            not_in_ratings += 1
-            if pd.isna(row['vote_count']):
-                df.at[idx, 'vote_count'] = 0
+    correct_count = int(correct_mask.sum())
+    incorrect_count = int(incorrect_mask.sum())
+    missing_count = int(missing_mask.sum())
+    not_in_ratings = int(not_in_ratings_mask.sum())
 
-    df = df.drop(columns=['id_int'])
+    df.loc[incorrect_mask, 'vote_count'] = actual_count[incorrect_mask]
+    df.loc[incorrect_mask, 'vote_average'] = actual_average[incorrect_mask]
+    df.loc[not_in_ratings_mask & df['vote_count'].isna(), 'vote_count'] = 0
 
     print("\n" + "="*70)
     print("SUMMARY STATISTICS - BEFORE FIXING")
@@ -191,43 +148,16 @@ def fix_vote_counts(df, ratings_df, links_df):
     print("VERIFYING FIXED VOTE COUNTS AND AVERAGES...")
     print("="*70)
 
-    df['id_int'] = pd.to_numeric(df['id'], errors='coerce').astype('Int64')
-
-    verified_correct_count = 0
-    verified_incorrect_count = 0
-    verified_correct_average = 0
-    verified_incorrect_average = 0
-    verified_missing = 0
-    verified_not_in_ratings = 0
-
-    for idx, row in df.iterrows():
-        tmdb_id = row['id_int']
-        csv_count = row['vote_count']
-        csv_average = row['vote_average']
+    # Vote average is compared with a tolerance for floating point differences
+    count_ok = in_ratings_mask & (np.trunc(df['vote_count']) == actual_count)
+    average_ok = in_ratings_mask & ((df['vote_average'] - actual_average).abs() < 0.01)
 
-        if pd.isna(tmdb_id):
-            verified_missing += 1
-            continue
-
-        if tmdb_id in vote_counts:
-            actual_count = vote_counts[tmdb_id]
-            actual_average = vote_averages[tmdb_id]
-
-            # Check vote count
-            if pd.notna(csv_count) and int(csv_count) == actual_count:
-                verified_correct_count += 1
-            else:
-                verified_incorrect_count += 1
-
-            # Check vote average (with tolerance for floating point comparison)
-            if pd.notna(csv_average) and abs(csv_average - actual_average) < 0.01:
-                verified_correct_average += 1
-            else:
-                verified_incorrect_average += 1
-        else:
-            verified_not_in_ratings += 1
-
-    df = df.drop(columns=['id_int'])
+    verified_correct_count = int(count_ok.sum())
+    verified_incorrect_count = int((in_ratings_mask & ~count_ok).sum())
+    verified_correct_average = int(average_ok.sum())
+    verified_incorrect_average = int((in_ratings_mask & ~average_ok).sum())
+    verified_missing = int(id_int.isna().sum())
+    verified_not_in_ratings = int((id_int.notna() & ~in_ratings_mask).sum())
 
     print("\n" + "="*70)
     print("SUMMARY STATISTICS - AFTER FIXING")
@@ -253,7 +183,7 @@ def fix_vote_counts(df, ratings_df, links_df):
     return df
 
 
-def merge_duplicate_movies(df, ratings_df=None, links_df=None):
+def merge_duplicate_movies(df, ratings_stats=None, links_df=None):
     print(f"\nChecking for duplicate movie IDs...")
     initial_count = len(df)
 
@@ -262,9 +192,9 @@ def merge_duplicate_movies(df, ratings_df=None, links_df=None):
     vote_counts = {}
     links_df_converted = None
 
-    if ratings_df is not None and links_df is not None:
+    if ratings_stats is not None and links_df is not None:
         print("Calculating vote counts from ratings data...")
-        ratings_counts = ratings_df.groupby('movieId').size().to_dict()
+        ratings_counts = ratings_stats['count']
         print(f"Calculated {len(ratings_counts)} vote counts from ratings")
 
         print("Converting links DataFrame types...")
@@ -281,15 +211,13 @@ def merge_duplicate_movies(df, ratings_df=None, links_df=None):
             print(f"  Sample rows: {test_match[['movieId', 'tmdbId']].head()}")
 
         print("Mapping tmdbId to movieId using links...")
-        for _, link_row in links_df_converted.iterrows():
-            tmdb_id = link_row['tmdbId']
-            movie_id = link_row['movieId']
-
-            if movie_id in ratings_counts:
-                if tmdb_id in vote_counts:
-                    vote_counts[tmdb_id] += ratings_counts[movie_id]
-                else:
-                    vote_counts[tmdb_id] = ratings_counts[movie_id]
+        vote_counts = (
+            links_df_converted[['tmdbId', 'movieId']]
+            .merge(ratings_counts, left_on='movieId', right_index=True, how='inner')
+            .groupby('tmdbId')['count']
+            .sum()
+            .to_dict()
+        )
 
         print(f"Mapped vote counts for {len(vote_counts)} movies (tmdbId -> movieId -> ratings)")
 
@@ -345,94 +273,61 @@ def merge_duplicate_movies(df, ratings_df=None, links_df=None):
     return merged_df
 
 
-def merge_duplicate_credits(df):
+def parse_credit_list(value):
+    return ast.literal_eval(value) if pd.notna(value) and value != '' else []
+
+
+def dedupe_by_credit_id(people):
+    seen_ids = set()
+    unique_people = []
+    for person in people:
+        credit_id_key = person.get('credit_id')
+        if credit_id_key and credit_id_key not in seen_ids:
+            seen_ids.add(credit_id_key)
+            unique_people.append(person)
+    return unique_people
+
+
+def merge_duplicate_credits(df, report=False):
     print(f"\nChecking for duplicate credit IDs...")
     initial_count = len(df)
 
-    duplicates = df[df.duplicated(subset=['id'], keep=False)]
+    duplicate_mask = df.duplicated(subset=['id'], keep=False)
 
-    if len(duplicates) == 0:
+    if not duplicate_mask.any():
         print("No duplicates found!")
         return df
 
+    duplicates = df[duplicate_mask].copy()
     duplicate_ids = duplicates['id'].unique()
     print(f"Found {len(duplicate_ids)} unique credit IDs with duplicates")
 
-    merged_rows = []
+    # Every cast/crew cell of the duplicated rows is parsed exactly once
+    duplicates['cast_parsed'] = duplicates['cast'].map(parse_credit_list)
+    duplicates['crew_parsed'] = duplicates['crew'].map(parse_credit_list)
 
-    for credit_id in duplicate_ids:
-        dup_rows = df[df['id'] == credit_id].copy()
+    merged_rows = []
+    crew_differs = 0
 
-        if len(dup_rows) > 1:
-            all_cast = []
-            all_crew = []
-
-            for _, row in dup_rows.iterrows():
-                cast = ast.literal_eval(row['cast']) if pd.notna(row['cast']) and row['cast'] != '' else []
-                crew = ast.literal_eval(row['crew']) if pd.notna(row['crew']) and row['crew'] != '' else []
-                all_cast.extend(cast)
-                all_crew.extend(crew)
-
-            crew_lists = []
-            for _, row in dup_rows.iterrows():
-                crew = ast.literal_eval(row['crew']) if pd.notna(row['crew']) and row['crew'] != '' else []
-                crew_lists.append(crew)
-
-            if len(set(str(sorted(c, key=lambda x: x.get('credit_id', ''))) for c in crew_lists)) > 1:
-                print(f"\n  ID {credit_id}: Crew differs between occurrences")
-
-                for i, crew_list in enumerate(crew_lists, 1):
-                    print(f"    Occurrence {i}: {len(crew_list)} crew members")
-
-                if len(crew_lists) == 2:
-                    crew1_ids = {c.get('credit_id'): c for c in crew_lists[0] if c.get('credit_id')}
-                    crew2_ids = {c.get('credit_id'): c for c in crew_lists[1] if c.get('credit_id')}
-
-                    only_in_1 = set(crew1_ids.keys()) - set(crew2_ids.keys())
-                    only_in_2 = set(crew2_ids.keys()) - set(crew1_ids.keys())
-
-                    if only_in_1:
-                        print(f"    Only in occurrence 1 ({len(only_in_1)} members):")
-                        for credit_id_key in list(only_in_1)[:5]:
-                            person = crew1_ids[credit_id_key]
-                            print(f"      - {person.get('name', 'Unknown')} as {person.get('job', 'Unknown')}")
-                        if len(only_in_1) > 5:
-                            print(f"      ... and {len(only_in_1) - 5} more")
-
-                    if only_in_2:
-                        print(f"    Only in occurrence 2 ({len(only_in_2)} members):")
-                        for credit_id_key in list(only_in_2)[:5]:
-                            person = crew2_ids[credit_id_key]
-                            print(f"      - {person.get('name', 'Unknown')} as {person.get('job', 'Unknown')}")
-                        if len(only_in_2) > 5:
-                            print(f"      ... and {len(only_in_2) - 5} more")
-
-            seen_cast_ids = set()
-            unique_cast = []
-            for person in all_cast:
-                credit_id_key = person.get('credit_id')
-                if credit_id_key and credit_id_key not in seen_cast_ids:
-                    seen_cast_ids.add(credit_id_key)
-                    unique_cast.append(person)
-
-            seen_crew_ids = set()
-            unique_crew = []
-            for person in all_crew:
-                credit_id_key = person.get('credit_id')
-                if credit_id_key and credit_id_key not in seen_crew_ids:
-                    seen_crew_ids.add(credit_id_key)
-                    unique_crew.append(person)
+    for credit_id, group in duplicates.groupby('id', sort=False):
+        unique_cast = dedupe_by_credit_id(chain.from_iterable(group['cast_parsed']))
+        unique_crew = dedupe_by_credit_id(chain.from_iterable(group['crew_parsed']))
 
-            merged = dup_rows.iloc[0].copy()
-            merged['cast'] = str(unique_cast)
-            merged['crew'] = str(unique_crew)
+        crew_sizes = [len(crew) for crew in group['crew_parsed']]
+        if len(unique_crew) > crew_sizes[0]:
+            crew_differs += 1
+            if report:
+                print(f"  ID {credit_id}: Merged crew from {crew_sizes} to {len(unique_crew)} unique members")
 
-            if len(unique_crew) > len(ast.literal_eval(dup_rows.iloc[0]['crew']) if pd.notna(dup_rows.iloc[0]['crew']) and dup_rows.iloc[0]['crew'] != '' else []):
-                print(f"  ID {credit_id}: Merged crew from {[len(ast.literal_eval(row['crew']) if pd.notna(row['crew']) and row['crew'] != '' else []) for _, row in dup_rows.iterrows()]} to {len(unique_crew)} unique members")
+        merged = group.iloc[0].drop(['cast_parsed', 'crew_parsed'])
+        merged['cast'] = str(unique_cast)
+        merged['crew'] = str(unique_crew)
+        merged_rows.append(merged)
 
-            merged_rows.append(merged)
+    if crew_differs:
+        print(f"{crew_differs} duplicate IDs gained crew members from later occurrences")
 
-    df_no_dupes = df[~df['id'].isin(duplicate_ids)].copy()
+    df_no_dupes = df[~duplicate_mask].copy()
     merged_df = pd.concat([df_no_dupes, pd.DataFrame(merged_rows)], ignore_index=True)
 
     print(f"\n[OK] Merged {initial_count - len(merged_df)} duplicate entries")
@@ -534,6 +429,55 @@ def clean_ratings(df):
     print(f"Final ratings rows: {len(cleaned_df)}")
     return cleaned_df
 
+
+def clean_ratings_chunked(input_path, output_path, chunksize=1_000_000, num_partitions=32):
+    """
+    Out-of-core variant of clean_ratings for files that don't fit in memory.
+
+    Ratings are hashed on (userId, movieId) into partition files on disk, so
+    all ratings of a pair end up in the same partition. Each partition is then
+    deduplicated on its own (keeping the most recent timestamp) and appended to
+    the output, which is therefore ordered by partition, not globally by time.
+    """
+    input_path = Path(input_path)
+    output_file = Path(output_path)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    original_rows = 0
+    final_rows = 0
+
+    with tempfile.TemporaryDirectory(prefix='ratings_partitions_', dir=output_file.parent) as tmp_dir:
+        partition_paths = [Path(tmp_dir) / f"part_{i:03d}.csv" for i in range(num_partitions)]
+
+        for chunk in iter_ratings(input_path, chunksize=chunksize):
+            original_rows += len(chunk)
+            partitions = pd.util.hash_pandas_object(chunk[['userId', 'movieId']], index=False) % num_partitions
+            for partition, part_df in chunk.groupby(partitions.to_numpy()):
+                part_path = partition_paths[partition]
+                part_df.to_csv(part_path, mode='a', header=not part_path.exists(), index=False)
+            print(f"  Partitioned {original_rows:,} ratings...")
+
+        print(f"Original ratings rows: {original_rows}")
+
+        for part_path in partition_paths:
+            if not part_path.exists():
+                continue
+            part_df = read_ratings(part_path, verbose=False)
+            part_df = part_df.sort_values('timestamp', ascending=False)
+            part_df = part_df[~part_df.duplicated(subset=['userId', 'movieId'], keep='first')]
+            part_df.to_csv(output_file, mode='a' if final_rows else 'w', header=not final_rows, index=False)
+            final_rows += len(part_df)
+
+    duplicates_removed = original_rows - final_rows
+    if duplicates_removed > 0:
+        print(f"Found {duplicates_removed} duplicate rating entries")
+        print(f"Removed {duplicates_removed} duplicate entries (kept most recent)")
+    else:
+        print("No duplicates found")
+
+    print(f"Final ratings rows: {final_rows}")
+    print(f"Cleaned data saved to {output_file}")
+
 def save_cleaned_credits(df, output_path='data/movies_cleaned/credits_cleaned.csv'):
     output_file = Path(output_path)
     output_file.parent.mkdir(parents=True, exist_ok=True)
@@ -552,7 +496,8 @@ def save_cleaned_movies(df, output_path='data/movies_cleaned/movies_metadata_cle
 
     cleaned_out = df.copy()
     if 'popularity' in cleaned_out.columns:
-        cleaned_out = cleaned_out.drop(columns=['homepage', 'original_title', 'overview', 'popularity', 'poster_path', 'status', 'tagline', 'video'])
+        # overview and tagline are kept for the text index in setup_mongodb.py
+        cleaned_out = cleaned_out.drop(columns=['homepage', 'original_title', 'popularity', 'poster_path', 'status', 'video'])
 
     cleaned_out.to_csv(output_file, index=False)
     print(f"Cleaned data saved to {output_file}")
@@ -607,14 +552,25 @@ if __name__ == '__main__':
         'ratings_small.csv': 'data/movies_cleaned/ratings_small_cleaned.csv'
     }
 
-    ratings_df = None
+    parser = argparse.ArgumentParser(description='Clean the movie dataset files')
+    parser.add_argument('--out-of-core', action='store_true',
+                        help='Clean ratings.csv in chunks through on-disk partitions instead of in memory. '
+                             'The output is then ordered by partition, not by timestamp')
+    parser.add_argument('--chunksize', type=int, default=1_000_000,
+                        help='Rows per chunk for --out-of-core')
+    args = parser.parse_args()
+
+    # Files cleaned in chunks instead of being read into memory at once, only on request
+    OUT_OF_CORE_FILES = {'ratings.csv'} if args.out_of_core else set()
+
+    ratings_stats = None
     links_df = None
 
     ratings_path = Path('data/movies') / 'ratings.csv'
     if ratings_path.exists():
-        print("Loading ratings data for vote count calculation...")
-        ratings_df = pd.read_csv(ratings_path, low_memory=False)
-        print(f"Loaded {len(ratings_df)} ratings")
+        print("Loading ratings aggregate for vote count calculation...")
+        ratings_stats = load_ratings_aggregate(ratings_path)
+        print(f"Loaded ratings aggregate for {len(ratings_stats)} movieIds")
 
     links_path = Path('data/movies') / 'links.csv'
     if links_path.exists():
@@ -628,16 +584,24 @@ if __name__ == '__main__':
             print(f"\n{'='*60}")
             print(f"Processing {input_file}...")
             print('='*60)
-            df = pd.read_csv(data_path, low_memory=False)
+
+            if input_file in OUT_OF_CORE_FILES:
+                clean_ratings_chunked(data_path, output_file, chunksize=args.chunksize)
+                continue
+
+            if input_file in ['ratings.csv', 'ratings_small.csv']:
+                df = read_ratings(data_path)
+            else:
+                df = pd.read_csv(data_path, low_memory=False)
             original_rows = len(df)
 
             if input_file == 'movies_metadata.csv':
                 cleaned_df = clean_movies_runtime(df)
-                if ratings_df is not None and links_df is not None:
-                    cleaned_df = fix_vote_counts(cleaned_df, ratings_df, links_df)
+                if ratings_stats is not None and links_df is not None:
+                    cleaned_df = fix_vote_counts(cleaned_df, ratings_stats, links_df)
                 else:
                     print("WARNING: ratings or links data not available, skipping vote count correction")
-                cleaned_df = merge_duplicate_movies(cleaned_df, ratings_df, links_df)
+                cleaned_df = merge_duplicate_movies(cleaned_df, ratings_stats, links_df)
                 # Print vote and revenue statistics required for the report
                 try:
                     print_vote_and_revenue_stats(cleaned_df)
@@ -1,15 +1,138 @@
 import ast
+import math
 from collections import Counter
 from pathlib import Path
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
 from tabulate import tabulate
 
 data_dir = Path('../data/movies')
 figures_dir = Path('../figures')
 figures_dir.mkdir(exist_ok=True)
 
+NESTED_NAME_FIELDS = ['production_companies', 'production_countries', 'spoken_languages', 'belongs_to_collection']
+
+# Columns summarized (mean, median, min, max) during the profiling pass
+NUMERIC_SUMMARY_FIELDS = ['budget', 'revenue', 'runtime', 'vote_average', 'vote_count']
+
+
+def parse_genres(genre_str):
+    try:
+        genres = ast.literal_eval(genre_str)
+        return [g['name'] for g in genres] if isinstance(genres, list) else []
+    except Exception:
+        return []
+
+
+def extract_names(field_str, key='name'):
+    try:
+        items = ast.literal_eval(field_str)
+        if isinstance(items, list):
+            return [item[key] for item in items if key in item]
+        elif isinstance(items, dict) and key in items:
+            return [items[key]]
+        else:
+            return []
+    except Exception:
+        return []
+
+
+def _is_null(value):
+    # NaN is the only value that is not equal to itself
+    return value is None or value is pd.NaT or value != value
+
+
+def _to_number(value):
+    """Like pd.to_numeric(errors='coerce') for a single value"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class NumericSummary:
+    """Running count, sum, min and max of a column; values are kept for the median"""
+
+    def __init__(self):
+        self.count = 0
+        self.values = []
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, value):
+        if value != value:
+            return
+        self.count += 1
+        self.values.append(value)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def mean(self):
+        return math.fsum(self.values) / self.count if self.count else math.nan
+
+    def median(self):
+        # The median needs every value, so it is the one statistic not computed on the fly
+        return float(np.median(self.values)) if self.count else math.nan
+
+
+def profile_movies(df):
+    """
+    Profile the metadata in a single pass over the rows: null and zero counts
+    per column, numeric summaries, and the parsed nested fields with their
+    name tallies.
+    """
+    columns = list(df.columns)
+    zero_checked = {
+        col for col in columns
+        if is_numeric_dtype(df[col]) and not is_bool_dtype(df[col])
+    }
+
+    profile = {field: Counter() for field in NESTED_NAME_FIELDS}
+    profile['genres'] = Counter()
+    profile['genres_list'] = []
+    profile['movies_without_genres'] = 0
+    profile['rows'] = len(df)
+    profile['null_counts'] = Counter()
+    profile['zero_counts'] = Counter()
+    profile['numeric'] = {field: NumericSummary() for field in NUMERIC_SUMMARY_FIELDS if field in df.columns}
+    profile['runtime_above_300'] = 0
+    profile['runtime_zero'] = 0
+
+    for row in zip(*(df[col] for col in columns)):
+        record = dict(zip(columns, row))
+
+        for col, value in record.items():
+            if _is_null(value):
+                profile['null_counts'][col] += 1
+            elif col in zero_checked and value == 0:
+                profile['zero_counts'][col] += 1
+
+        for field, summary in profile['numeric'].items():
+            summary.update(_to_number(record[field]))
+
+        runtime = _to_number(record.get('runtime'))
+        if runtime > 300:
+            profile['runtime_above_300'] += 1
+        elif runtime == 0:
+            profile['runtime_zero'] += 1
+
+        genres = parse_genres(record['genres'])
+        profile['genres_list'].append(genres)
+        profile['genres'].update(genres)
+        if not genres:
+            profile['movies_without_genres'] += 1
+
+        for field in NESTED_NAME_FIELDS:
+            value = record[field]
+            if not _is_null(value):
+                profile[field].update(extract_names(value))
+
+    return profile
+
+
 def analyze_movies_metadata(df):
     """Analyze movies_metadata.csv"""
     print("=== Movies Metadata Analysis ===")
@@ -18,44 +141,48 @@ def analyze_movies_metadata(df):
     print("Features and types:")
     print(tabulate(dtypes_table, headers=['Feature', 'Type'], tablefmt='grid'))
 
+    profile = profile_movies(df)
+
     print("\nMissing values and zero values:")
-    missing = df.isnull().sum()
+    rows = profile['rows']
     for col in df.columns:
-        null_count = missing[col]
-        zero_count = (df[col] == 0).sum() if df[col].dtype in ['int64', 'float64'] else 0
+        null_count = profile['null_counts'][col]
+        zero_count = profile['zero_counts'][col]
         if null_count > 0 or zero_count > 0:
-            print(f"  {col}: {null_count} null ({null_count/len(df)*100:.2f}%), {zero_count} zero ({zero_count/len(df)*100:.2f}%)")
-    if missing.sum() == 0 and all((df[col] != 0).sum() == len(df) for col in df.columns if df[col].dtype in ['int64', 'float64']):
+            print(f"  {col}: {null_count} null ({null_count/rows*100:.2f}%), {zero_count} zero ({zero_count/rows*100:.2f}%)")
+    if not profile['null_counts'] and not profile['zero_counts']:
         print("  No missing or zero values found.")
 
-    analyze_movies_metadata_specific(df)
+    analyze_movies_metadata_specific(df, profile)
 
-def analyze_movies_metadata_specific(df):
+def analyze_movies_metadata_specific(df, profile):
     df['budget'] = pd.to_numeric(df['budget'], errors='coerce')
     df['revenue'] = pd.to_numeric(df['revenue'], errors='coerce')
 
     print("\n=== Movies Metadata Specific Analysis ===")
 
+    numeric = profile['numeric']
+
     print("Budget statistics:")
-    print(f"  Mean: {df['budget'].mean():.2f}")
-    print(f"  Median: {df['budget'].median():.2f}")
-    print(f"  Max: {df['budget'].max():.2f}")
-    print(f"  Min: {df['budget'].min():.2f}")
+    print(f"  Mean: {numeric['budget'].mean():.2f}")
+    print(f"  Median: {numeric['budget'].median():.2f}")
+    print(f"  Max: {numeric['budget'].max:.2f}")
+    print(f"  Min: {numeric['budget'].min:.2f}")
 
     print("Revenue statistics:")
-    print(f"  Mean: {df['revenue'].mean():.2f}")
-    print(f"  Median: {df['revenue'].median():.2f}")
-    print(f"  Max: {df['revenue'].max():.2f}")
-    print(f"  Min: {df['revenue'].min():.2f}")
+    print(f"  Mean: {numeric['revenue'].mean():.2f}")
+    print(f"  Median: {numeric['revenue'].median():.2f}")
+    print(f"  Max: {numeric['revenue'].max:.2f}")
+    print(f"  Min: {numeric['revenue'].min:.2f}")
 
     print("Runtime statistics:")
-    print(f"  Mean: {df['runtime'].mean():.2f} minutes")
-    print(f"  Median: {df['runtime'].median():.2f} minutes")
-    print(f"  Max: {df['runtime'].max():.2f} minutes")
-    print(f"  Min: {df['runtime'].min():.2f} minutes")
-    movies_above_300 = df[df['runtime'] > 300].shape[0]
+    print(f"  Mean: {numeric['runtime'].mean():.2f} minutes")
+    print(f"  Median: {numeric['runtime'].median():.2f} minutes")
+    print(f"  Max: {numeric['runtime'].max:.2f} minutes")
+    print(f"  Min: {numeric['runtime'].min:.2f} minutes")
+    movies_above_300 = profile['runtime_above_300']
     print(f"  Movies with runtime above 300 minutes: {movies_above_300}")
-    movies_zero_runtime = df[df['runtime'] == 0].shape[0]
+    movies_zero_runtime = profile['runtime_zero']
     print(f"  Movies with 0 runtime: {movies_zero_runtime}")
     if movies_zero_runtime > 0:
         print("  Sample movies with 0 runtime:")
@@ -63,8 +190,8 @@ def analyze_movies_metadata_specific(df):
         for idx, row in zero_runtime_movies.iterrows():
             print(f"    {row['title']} ({row['release_date']}) - {row['genres']}")
 
-    print(f"Average vote_average: {df['vote_average'].mean():.2f}")
-    print(f"Average vote_count: {df['vote_count'].mean():.2f}")
+    print(f"Average vote_average: {numeric['vote_average'].mean():.2f}")
+    print(f"Average vote_count: {numeric['vote_count'].mean():.2f}")
 
     # Vote Average Distribution
     plt.figure(figsize=(10, 6))
@@ -114,25 +241,15 @@ def analyze_movies_metadata_specific(df):
     plt.savefig(figures_dir / 'runtime_hist_99percentile.png')
     plt.close()
 
-    def extract_genres(genre_str):
-        try:
-            genres = ast.literal_eval(genre_str)
-            return [g['name'] for g in genres] if isinstance(genres, list) else []
-        except:
-            return []
+    df['genres_list'] = profile['genres_list']
+    df['main_genre'] = [genres[0] if genres else 'Unknown' for genres in profile['genres_list']]
 
-    df['genres_list'] = df['genres'].apply(extract_genres)
-    df['main_genre'] = df['genres_list'].apply(lambda x: x[0] if x else 'Unknown')
-
-    movies_without_genres = df['genres_list'].apply(lambda x: len(x) == 0).sum()
+    movies_without_genres = profile['movies_without_genres']
     print(f"Movies without genres: {movies_without_genres}")
 
     print("\n=== Genre Analysis ===")
 
-    all_genres = []
-    for genres_list in df['genres_list']:
-        all_genres.extend(genres_list)
-    unique_genres = sorted(set(all_genres))
+    unique_genres = sorted(profile['genres'])
 
     invalid_genres = {'Aniplex', 'BROSTA TV', 'Carousel Productions', 'GoHands',
                      'Mardock Scramble Production Committee', 'Odyssey Media',
@@ -146,9 +263,11 @@ def analyze_movies_metadata_specific(df):
     print(f"\nInvalid entries found (production companies): {len(invalid_genres)}")
     print(f"  {', '.join(sorted(invalid_genres))}")
 
-    df_exploded = df.explode('genres_list')
-    df_exploded = df_exploded[df_exploded['genres_list'].notna() & (df_exploded['genres_list'] != '')]
-    df_exploded = df_exploded[~df_exploded['genres_list'].isin(invalid_genres)]
+    # Explode once, then split into valid genres and the invalid (company) entries
+    df_all_genres = df.explode('genres_list')
+    df_all_genres = df_all_genres[df_all_genres['genres_list'].notna() & (df_all_genres['genres_list'] != '')]
+    invalid_genre_mask = df_all_genres['genres_list'].isin(invalid_genres)
+    df_exploded = df_all_genres[~invalid_genre_mask]
 
     print("\n=== Average and Median Runtime for Each Genre (All 20 Genres) ===")
     genre_runtime_stats = df_exploded.groupby('genres_list')['runtime'].agg(['mean', 'median', 'count']).sort_values('mean', ascending=False)
@@ -162,9 +281,7 @@ def analyze_movies_metadata_specific(df):
 
     # Analyze the 12 invalid "genres" (production companies)
     print("\n=== Invalid Genre Entries (Production Companies) ===")
-    df_invalid = df.explode('genres_list')
-    df_invalid = df_invalid[df_invalid['genres_list'].notna() & (df_invalid['genres_list'] != '')]
-    df_invalid = df_invalid[df_invalid['genres_list'].isin(invalid_genres)]
+    df_invalid = df_all_genres[invalid_genre_mask]
     
     if len(df_invalid) > 0:
         print(f"Found {len(df_invalid)} entries with invalid genres")
@@ -238,35 +355,15 @@ def analyze_movies_metadata_specific(df):
     plt.close()
     print("Runtime vs Popularity scatter plot saved to figures/runtime_popularity_scatter.png")
 
-    def extract_names(field_str, key='name'):
-        try:
-            items = ast.literal_eval(field_str)
-            if isinstance(items, list):
-                return [item[key] for item in items if key in item]
-            elif isinstance(items, dict) and key in items:
-                return [items[key]]
-            else:
-                return []
-        except:
-            return []
-
-    all_prod_companies = []
-    for comp_str in df['production_companies'].dropna():
-        all_prod_companies.extend(extract_names(comp_str))
-    unique_prod_companies = set(all_prod_companies)
-    print(f"Number of unique production companies: {len(unique_prod_companies)}")
-    company_counts = Counter(all_prod_companies)
+    company_counts = profile['production_companies']
+    print(f"Number of unique production companies: {len(company_counts)}")
     top_companies = company_counts.most_common(3)
     print("Top 3 production companies:")
     for company, count in top_companies:
         print(f"  {company}: {count}")
 
-    all_prod_countries = []
-    for country_str in df['production_countries'].dropna():
-        all_prod_countries.extend(extract_names(country_str))
-    unique_prod_countries = set(all_prod_countries)
-    print(f"Number of unique production countries: {len(unique_prod_countries)}")
-    country_counts = Counter(all_prod_countries)
+    country_counts = profile['production_countries']
+    print(f"Number of unique production countries: {len(country_counts)}")
     top_countries = country_counts.most_common(10)
     print("Top 3 production countries:")
     for country, count in top_countries[:3]:
@@ -283,30 +380,22 @@ def analyze_movies_metadata_specific(df):
     plt.savefig(figures_dir / 'production_countries_bar.png')
     plt.close()
 
-    all_spoken_langs = []
-    for lang_str in df['spoken_languages'].dropna():
-        all_spoken_langs.extend(extract_names(lang_str))
-    unique_spoken_langs = set(all_spoken_langs)
-    print(f"Number of unique spoken languages: {len(unique_spoken_langs)}")
-    lang_counts = Counter(all_spoken_langs)
+    lang_counts = profile['spoken_languages']
+    print(f"Number of unique spoken languages: {len(lang_counts)}")
     top_langs = lang_counts.most_common(3)
     print("Top 3 spoken languages:")
     for lang, count in top_langs:
         print(f"  {lang}: {count}")
-    avg_movies_per_lang = len(all_spoken_langs) / len(unique_spoken_langs) if unique_spoken_langs else 0
+    avg_movies_per_lang = sum(lang_counts.values()) / len(lang_counts) if lang_counts else 0
     print(f"Average number of movies per spoken language: {avg_movies_per_lang:.2f}")
 
-    all_collections = []
-    for coll_str in df['belongs_to_collection'].dropna():
-        all_collections.extend(extract_names(coll_str))
-    unique_collections = set(all_collections)
-    print(f"Number of unique collections: {len(unique_collections)}")
-    collection_counts = Counter(all_collections)
+    collection_counts = profile['belongs_to_collection']
+    print(f"Number of unique collections: {len(collection_counts)}")
     top_collections = collection_counts.most_common(10)
     print("Top 10 collections:")
     for coll, count in top_collections:
         print(f"  {coll}: {count}")
-    avg_movies_per_collection = len(all_collections) / len(unique_collections) if unique_collections else 0
+    avg_movies_per_collection = sum(collection_counts.values()) / len(collection_counts) if collection_counts else 0
     print(f"Average number of movies in a collection: {avg_movies_per_collection:.2f}")
 
 def main():
@@ -1,9 +1,17 @@
+import argparse
+import sys
+from collections import Counter
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from tabulate import tabulate
 
+sys.path.append('..')
+from ratings_io import iter_ratings, read_ratings
+
 data_dir = Path('../data/movies')
+cache_dir = Path('../data/cache')
 
 def analyze_ratings(df):
     print("=== Ratings Analysis ===")
@@ -28,10 +36,10 @@ def analyze_ratings(df):
     print("\nDetailed missing values and zero values:")
     for col in df.columns:
         null_count = missing[col]
-        zero_count = (df[col] == 0).sum() if df[col].dtype in ['int64', 'float64'] else 0
+        zero_count = (df[col] == 0).sum() if pd.api.types.is_numeric_dtype(df[col]) else 0
         if null_count > 0 or zero_count > 0:
             print(f"  {col}: {null_count} null ({null_count/len(df)*100:.2f}%), {zero_count} zero ({zero_count/len(df)*100:.2f}%)")
-    if missing.sum() == 0 and all((df[col] != 0).sum() == len(df) for col in df.columns if df[col].dtype in ['int64', 'float64']):
+    if missing.sum() == 0 and all((df[col] != 0).sum() == len(df) for col in df.columns if pd.api.types.is_numeric_dtype(df[col])):
         print("  No missing or zero values found.")
 
     analyze_ratings_specific(df)
@@ -73,7 +81,8 @@ def analyze_ratings_specific(df):
                 break
 
         if rating_col:
-            ratings = pd.to_numeric(df[rating_col], errors='coerce').dropna()
+            # float16 ratings must be upcast, their sums overflow
+            ratings = pd.to_numeric(df[rating_col], errors='coerce').dropna().astype('float64')
             if len(ratings) > 0:
                 r_min = ratings.min()
                 r_max = ratings.max()
@@ -92,11 +101,177 @@ def analyze_ratings_specific(df):
     except Exception as e:
         print(f"Error analyzing ratings: {e}")
 
+class HyperLogLog:
+    """Mergeable distinct-count sketch, about 0.8% standard error with 2^14 registers"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, values):
+        hashes = pd.util.hash_array(np.asarray(values))
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remaining_bits = 64 - self.precision
+        rest = hashes & np.uint64((1 << remaining_bits) - 1)
+        # Position of the leftmost 1-bit in the remaining bits; exact in float64 below 2^53
+        rank = np.full(len(rest), remaining_bits + 1, dtype=np.uint8)
+        nonzero = rest > 0
+        rank[nonzero] = remaining_bits - np.floor(np.log2(rest[nonzero].astype(np.float64))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if raw <= 2.5 * m and zeros > 0:
+            return m * np.log(m / zeros)
+        return raw
+
+
+class RatingsAccumulator:
+    """Mergeable per-chunk statistics for the streaming ratings report"""
+
+    def __init__(self):
+        self.rows = 0
+        self.dtypes = None
+        self.null_counts = None
+        self.zero_counts = None
+        self.rating_histogram = Counter()
+        self.rating_sum = 0.0
+        self.users = HyperLogLog()
+        self.movies = HyperLogLog()
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        if self.dtypes is None:
+            self.dtypes = chunk.dtypes
+
+        null_counts = chunk.isnull().sum()
+        zero_counts = pd.Series({
+            col: int((chunk[col] == 0).sum()) if pd.api.types.is_numeric_dtype(chunk[col]) else 0
+            for col in chunk.columns
+        })
+        self.null_counts = null_counts if self.null_counts is None else self.null_counts + null_counts
+        self.zero_counts = zero_counts if self.zero_counts is None else self.zero_counts + zero_counts
+
+        if 'rating' in chunk.columns:
+            ratings = chunk['rating'].dropna().astype('float64')
+            self.rating_histogram.update(ratings.value_counts().to_dict())
+            self.rating_sum += ratings.sum()
+        if 'userId' in chunk.columns:
+            self.users.add(chunk['userId'].dropna().to_numpy(dtype=np.int64))
+        if 'movieId' in chunk.columns:
+            self.movies.add(chunk['movieId'].dropna().to_numpy(dtype=np.int64))
+
+    def merge(self, other):
+        self.rows += other.rows
+        if self.dtypes is None:
+            self.dtypes = other.dtypes
+        if other.null_counts is not None:
+            self.null_counts = other.null_counts if self.null_counts is None else self.null_counts + other.null_counts
+            self.zero_counts = other.zero_counts if self.zero_counts is None else self.zero_counts + other.zero_counts
+        self.rating_histogram.update(other.rating_histogram)
+        self.rating_sum += other.rating_sum
+        self.users.merge(other.users)
+        self.movies.merge(other.movies)
+
+    def rating_median(self):
+        # Ratings are discrete, so the histogram gives the exact median
+        total = sum(self.rating_histogram.values())
+        values = sorted(self.rating_histogram)
+        cumulative = np.cumsum([self.rating_histogram[v] for v in values])
+        lower = values[np.searchsorted(cumulative, (total - 1) // 2 + 1)]
+        upper = values[np.searchsorted(cumulative, total // 2 + 1)]
+        return (lower + upper) / 2
+
+
+def report_ratings_stream(acc):
+    print("=== Ratings Analysis (streaming) ===")
+    print(f"Number of rows: {acc.rows}")
+
+    if acc.dtypes is None or acc.rows == 0:
+        # Empty or header-only file: no chunk ever set the columns
+        print("No ratings found.")
+        return
+    print(f"Number of columns: {len(acc.dtypes)}")
+
+    dtypes_table = [[col, str(dtype)] for col, dtype in acc.dtypes.items()]
+    print("\nFeatures and types:")
+    print(tabulate(dtypes_table, headers=['Feature', 'Type'], tablefmt='grid'))
+
+    print("\nMissing values:")
+    if 'userId' in acc.null_counts:
+        print(f"Rows with missing values for users (userId): {acc.null_counts['userId']}")
+    if 'movieId' in acc.null_counts:
+        print(f"Rows with missing values for movies (movieId): {acc.null_counts['movieId']}")
+
+    print("\nDetailed missing values and zero values:")
+    for col in acc.dtypes.index:
+        null_count = acc.null_counts[col]
+        zero_count = acc.zero_counts[col]
+        if null_count > 0 or zero_count > 0:
+            print(f"  {col}: {null_count} null ({null_count/acc.rows*100:.2f}%), {zero_count} zero ({zero_count/acc.rows*100:.2f}%)")
+    if acc.null_counts.sum() == 0 and acc.zero_counts.sum() == 0:
+        print("  No missing or zero values found.")
+
+    print("\n=== Ratings Specific Analysis ===")
+    print(f"Rows with missing values: {acc.null_counts.sum()}")
+
+    invalid_user_ids = acc.null_counts.get('userId', 0) + acc.zero_counts.get('userId', 0)
+    invalid_movie_ids = acc.null_counts.get('movieId', 0) + acc.zero_counts.get('movieId', 0)
+    print(f"Rows with invalid userId: {invalid_user_ids}")
+    print(f"Rows with invalid movieId: {invalid_movie_ids}")
+    print(f"Total rows with invalid IDs: {invalid_user_ids + invalid_movie_ids}")
+
+    print(f"Number of unique users (estimated): {acc.users.estimate():,.0f}")
+    print(f"Number of unique movies (estimated): {acc.movies.estimate():,.0f}")
+
+    rating_count = sum(acc.rating_histogram.values())
+    if rating_count > 0:
+        print("\nRating statistics:")
+        print(f"  min: {min(acc.rating_histogram):.3f}")
+        print(f"  max: {max(acc.rating_histogram):.3f}")
+        print(f"  median: {acc.rating_median():.3f}")
+        print(f"  mean: {acc.rating_sum / rating_count:.3f}")
+
+        histogram_table = [[f"{value:.1f}", count] for value, count in sorted(acc.rating_histogram.items())]
+        print("\nRating histogram:")
+        print(tabulate(histogram_table, headers=['Rating', 'Count'], tablefmt='grid'))
+    else:
+        print("No valid rating values found (all missing or non-numeric).")
+
+
+def analyze_ratings_stream(data_path, chunksize=1_000_000):
+    acc = RatingsAccumulator()
+    try:
+        for chunk in iter_ratings(data_path, chunksize=chunksize):
+            acc.update(chunk)
+    except pd.errors.EmptyDataError:
+        # Not even a header line, so there is nothing to stream
+        pass
+    report_ratings_stream(acc)
+    return acc
+
+
 def main():
+    parser = argparse.ArgumentParser(description='EDA for ratings.csv')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='Load the whole file instead of streaming it in chunks (exact distinct counts)')
+    parser.add_argument('--chunksize', type=int, default=1_000_000,
+                        help='Rows per chunk in streaming mode')
+    args = parser.parse_args()
+
     data_path = data_dir / 'ratings.csv'
     if data_path.exists():
-        df = pd.read_csv(data_path, low_memory=False)
-        analyze_ratings(df)
+        if args.in_memory:
+            df = read_ratings(data_path, cache=True, cache_dir=cache_dir)
+            analyze_ratings(df)
+        else:
+            analyze_ratings_stream(data_path, chunksize=args.chunksize)
     else:
         print(f"Data file not found: {data_path}")
 
@@ -1,9 +1,14 @@
+import sys
 from pathlib import Path
 
 import pandas as pd
 from tabulate import tabulate
 
+sys.path.append('..')
+from ratings_io import read_ratings
+
 data_dir = Path('../data/movies')
+cache_dir = Path('../data/cache')
 
 def analyze_ratings_small(df):
     print("=== Ratings Small Analysis ===")
@@ -16,10 +21,10 @@ def analyze_ratings_small(df):
     missing = df.isnull().sum()
     for col in df.columns:
         null_count = missing[col]
-        zero_count = (df[col] == 0).sum() if df[col].dtype in ['int64', 'float64'] else 0
+        zero_count = (df[col] == 0).sum() if pd.api.types.is_numeric_dtype(df[col]) else 0
         if null_count > 0 or zero_count > 0:
             print(f"  {col}: {null_count} null ({null_count/len(df)*100:.2f}%), {zero_count} zero ({zero_count/len(df)*100:.2f}%)")
-    if missing.sum() == 0 and all((df[col] != 0).sum() == len(df) for col in df.columns if df[col].dtype in ['int64', 'float64']):
+    if missing.sum() == 0 and all((df[col] != 0).sum() == len(df) for col in df.columns if pd.api.types.is_numeric_dtype(df[col])):
         print("  No missing or zero values found.")
 
     analyze_ratings_small_specific(df)
@@ -38,7 +43,7 @@ def analyze_ratings_small_specific(df):
         print(f"Rows with invalid movieId: {invalid_movie_ids}")
         print(f"Total rows with invalid IDs: {total_invalid_ids}")
 
-        avg_rating = df['rating'].mean()
+        avg_rating = df['rating'].astype('float64').mean()
         print(f"Average rating: {avg_rating:.2f}")
 
     except Exception as e:
@@ -47,7 +52,7 @@ def analyze_ratings_small_specific(df):
 def main():
     data_path = data_dir / 'ratings_small.csv'
     if data_path.exists():
-        df = pd.read_csv(data_path, low_memory=False)
+        df = read_ratings(data_path, cache=True, cache_dir=cache_dir)
         analyze_ratings_small(df)
     else:
         print(f"Data file not found: {data_path}")
@@ -1,46 +1,117 @@
+import argparse
+import os
 import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+from tabulate import tabulate
+
+log_dir = Path(__file__).parent / 'logs'
+
+EDA_SCRIPTS = [
+    'eda_movies_metadata',
+    'eda_credits',
+    'eda_keywords',
+    'eda_links',
+    'eda_links_small',
+    'eda_ratings',
+    'eda_ratings_small'
+]
+
+
+def peak_memory_mb(rusage):
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return rusage.ru_maxrss / divisor
+
 
 def run_eda_script(script_name):
     script_path = Path(__file__).parent / f"{script_name}.py"
-    script_dir = script_path.parent
-    if script_path.exists():
-        print(f"\n{'='*50}")
-        print(f"Running {script_name}")
-        print('='*50)
-        try:
-            result = subprocess.run([sys.executable, str(script_path)], capture_output=True, text=True, cwd=script_dir)
-            print(result.stdout)
-            if result.stderr:
-                print("STDERR:", result.stderr)
-            if result.returncode != 0:
-                print(f"Error running {script_name}: return code {result.returncode}")
-        except Exception as e:
-            print(f"Failed to run {script_name}: {e}")
-    else:
-        print(f"Script {script_name} not found")
+    result = {
+        'script': script_name,
+        'status': 'not found',
+        'seconds': None,
+        'peak_mb': None,
+        'log': None
+    }
+    if not script_path.exists():
+        return result
+
+    log_path = log_dir / f"{script_name}.log"
+    start = time.perf_counter()
+    try:
+        with open(log_path, 'w') as log_file:
+            proc = subprocess.Popen([sys.executable, str(script_path)], stdout=log_file,
+                                    stderr=subprocess.STDOUT, cwd=script_path.parent)
+            if hasattr(os, 'wait4'):
+                # wait4 reports the resource usage of exactly this child
+                _, status, rusage = os.wait4(proc.pid, 0)
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                result['peak_mb'] = peak_memory_mb(rusage)
+            else:
+                proc.wait()
+        result['status'] = 'ok' if proc.returncode == 0 else f"return code {proc.returncode}"
+    except Exception as e:
+        result['status'] = f"failed: {e}"
+
+    result['seconds'] = time.perf_counter() - start
+    result['log'] = str(log_path)
+    return result
+
 
 def main():
-    eda_scripts = [
-        'eda_movies_metadata',
-        'eda_credits',
-        'eda_keywords',
-        'eda_links',
-        'eda_links_small',
-        'eda_ratings',
-        'eda_ratings_small'
-    ]
+    parser = argparse.ArgumentParser(description='Run the EDA scripts concurrently')
+    parser.add_argument('scripts', nargs='*', default=EDA_SCRIPTS,
+                        help='Scripts to run (default: all)')
+    parser.add_argument('-w', '--workers', type=int, default=min(len(EDA_SCRIPTS), os.cpu_count() or 1),
+                        help='Number of scripts to run at the same time')
+    parser.add_argument('--show-output', action='store_true',
+                        help='Print every log after all scripts have finished')
+    args = parser.parse_args()
+
+    log_dir.mkdir(exist_ok=True)
 
-    print("Running all EDA analyses...")
+    print(f"Running {len(args.scripts)} EDA analyses with {args.workers} workers...")
+    print(f"Output of each script is written to {log_dir}")
 
-    for script in eda_scripts:
-        run_eda_script(script)
+    start = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(run_eda_script, script): script for script in args.scripts}
+        for future in as_completed(futures):
+            result = future.result()
+            results[result['script']] = result
+            seconds = f"{result['seconds']:.1f}s" if result['seconds'] is not None else '-'
+            print(f"  {result['script']}: {result['status']} ({seconds})")
+    total_seconds = time.perf_counter() - start
+
+    if args.show_output:
+        for script in args.scripts:
+            log = results[script]['log']
+            if log:
+                print(f"\n{'='*50}")
+                print(f"Output of {script}")
+                print('='*50)
+                print(Path(log).read_text())
+
+    table = [
+        [
+            script,
+            results[script]['status'],
+            f"{results[script]['seconds']:.2f}" if results[script]['seconds'] is not None else '-',
+            f"{results[script]['peak_mb']:.1f}" if results[script]['peak_mb'] is not None else 'N/A',
+            results[script]['log'] or '-'
+        ]
+        for script in args.scripts
+    ]
 
     print(f"\n{'='*50}")
     print("All EDA analyses completed!")
     print('='*50)
+    print(tabulate(table, headers=['Script', 'Status', 'Wall time (s)', 'Peak memory (MB)', 'Log'], tablefmt='grid'))
+    print(f"Total wall time: {total_seconds:.2f}s")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the old regex scan of query 7 with the text index search it uses now.
+"""
+
+import argparse
+import sys
+import time
+
+from tabulate import tabulate
+
+sys.path.append('..')
+from DbConnector import DbConnector
+
+STRATEGIES = {
+    'regex on keywords': {
+        'keywords': {'$elemMatch': {'$regex': 'noir', '$options': 'i'}},
+        'vote_count': {'$gte': 50}
+    },
+    'text index': {
+        '$text': {'$search': 'noir'},
+        'vote_count': {'$gte': 50}
+    }
+}
+
+
+def find_top(db, query):
+    return list(db.movies.find(query, {'_id': 0, 'id': 1}).sort('vote_average', -1).limit(20))
+
+
+def execution_stats(db, query):
+    explain = db.command(
+        'explain',
+        {'find': 'movies', 'filter': query, 'sort': {'vote_average': -1}, 'limit': 20},
+        verbosity='executionStats'
+    )
+    stats = explain['executionStats']
+    return stats['totalDocsExamined'], stats['totalKeysExamined'], stats['nReturned']
+
+
+def benchmark(repeat=5):
+    db_connector = DbConnector(DATABASE='assignment3')
+    db = db_connector.db
+
+    table = []
+    matched = {}
+    for name, query in STRATEGIES.items():
+        # Warm up the cache once so every strategy is timed the same way
+        matched[name] = {movie['id'] for movie in find_top(db, query)}
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            find_top(db, query)
+            timings.append(time.perf_counter() - start)
+
+        docs_examined, keys_examined, returned = execution_stats(db, query)
+        table.append([
+            name,
+            f"{min(timings) * 1000:.1f}",
+            f"{sum(timings) / len(timings) * 1000:.1f}",
+            docs_examined,
+            keys_examined,
+            returned
+        ])
+
+    print("\n" + "="*100)
+    print(f"Query 7 benchmark: best and mean of {repeat} runs")
+    print("="*100)
+    print(tabulate(table, headers=['Strategy', 'Best (ms)', 'Mean (ms)', 'Docs examined', 'Keys examined', 'Returned'],
+                   tablefmt='grid'))
+
+    regex_ids, text_ids = matched['regex on keywords'], matched['text index']
+    print(f"\nTop 20 movies found by both: {len(regex_ids & text_ids)}")
+    print(f"Only by the regex scan: {len(regex_ids - text_ids)}")
+    print(f"Only by the text search: {len(text_ids - regex_ids)}")
+
+    db_connector.close_connection()
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the regex and text index versions of query 7')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per strategy')
+    args = parser.parse_args()
+
+    benchmark(args.repeat)
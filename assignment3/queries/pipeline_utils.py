@@ -0,0 +1,138 @@
+"""
+Helpers for building aggregation pipeline stages shared by the queries.
+"""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _client_server_version(client):
+    version = client.server_info()['version']
+    return tuple(int(part) for part in version.split('.')[:2])
+
+
+def server_version(db):
+    # Asked once per client, since every query builds its pipeline with it
+    return _client_server_version(db.client)
+
+
+def median_stages(db, input_expr, output_field, approximate=False):
+    """
+    Build the median of input_expr per group, stored in output_field.
+
+    Returns a tuple (accumulators, stages): accumulators go into the $group
+    stage, and stages must run after it. By default the median is exact: the
+    values of each group are collected with $push and sorted with $sortArray,
+    and an even count averages the two middle values. With approximate=True
+    on MongoDB 7.0+, the native $median accumulator (approximate method) is
+    used instead and no extra stages are needed.
+    """
+    if approximate and server_version(db) >= (7, 0):
+        return {output_field: {'$median': {'input': input_expr, 'method': 'approximate'}}}, []
+
+    values_field = f"_{output_field}_values"
+    accumulators = {values_field: {'$push': input_expr}}
+    stages = [
+        {'$addFields': {
+            output_field: {
+                '$let': {
+                    'vars': {
+                        'sorted': {'$sortArray': {'input': f"${values_field}", 'sortBy': 1}}
+                    },
+                    'in': {
+                        '$let': {
+                            'vars': {
+                                'size': {'$size': '$$sorted'},
+                                'mid': {'$floor': {'$divide': [{'$size': '$$sorted'}, 2]}}
+                            },
+                            'in': {
+                                '$cond': [
+                                    {'$eq': [{'$mod': ['$$size', 2]}, 0]},
+                                    {'$avg': [
+                                        {'$arrayElemAt': ['$$sorted', '$$mid']},
+                                        {'$arrayElemAt': ['$$sorted', {'$subtract': ['$$mid', 1]}]}
+                                    ]},
+                                    {'$arrayElemAt': ['$$sorted', '$$mid']}
+                                ]
+                            }
+                        }
+                    }
+                }
+            }
+        }},
+        {'$unset': values_field}
+    ]
+    return accumulators, stages
+
+
+def load_genres(db):
+    """
+    Return the genre lookup table from the genres collection, ordered by bit.
+    """
+    return list(db.genres.find({}, {'_id': 0, 'bit': 1, 'mask': 1, 'name': 1}).sort('bit', 1))
+
+
+def supports_bitwise_operators(db):
+    # $bitAnd/$bitOr expressions were added in MongoDB 6.3
+    return server_version(db) >= (6, 3)
+
+
+def _has_bit(db, mask_expr, bit_expr):
+    """
+    Expression testing whether the single-bit value bit_expr is set in mask_expr.
+    Older servers divide by the bit value and check the parity, which is exact
+    for masks below 2^53.
+    """
+    mask_expr = {'$ifNull': [mask_expr, 0]}
+    if supports_bitwise_operators(db):
+        return {'$ne': [{'$bitAnd': [mask_expr, bit_expr]}, 0]}
+    return {'$eq': [{'$mod': [{'$floor': {'$divide': [mask_expr, bit_expr]}}, 2]}, 1]}
+
+
+def genre_mask_union(db, masks_expr, genres):
+    """
+    Expression OR-ing an array of genre masks into one mask. Without $bitOr
+    the bits set in any mask are summed instead, which gives the same value.
+    """
+    if supports_bitwise_operators(db):
+        return {
+            '$reduce': {
+                'input': {'$ifNull': [masks_expr, []]},
+                'initialValue': 0,
+                'in': {'$bitOr': ['$$value', {'$ifNull': ['$$this', 0]}]}
+            }
+        }
+    return {
+        '$sum': {
+            '$filter': {
+                'input': [genre['mask'] for genre in genres],
+                'as': 'bit',
+                'cond': {'$anyElementTrue': [{
+                    '$map': {
+                        'input': {'$ifNull': [masks_expr, []]},
+                        'as': 'mask',
+                        'in': _has_bit(db, '$$mask', '$$bit')
+                    }
+                }]}
+            }
+        }
+    }
+
+
+def genre_count(db, mask_expr, genres):
+    """
+    Expression counting the bits set in a genre mask.
+    """
+    return {
+        '$size': {
+            '$filter': {
+                'input': [genre['mask'] for genre in genres],
+                'as': 'bit',
+                'cond': _has_bit(db, mask_expr, '$$bit')
+            }
+        }
+    }
+
+
+def genre_names(mask, genres):
+    return [genre['name'] for genre in genres if mask & genre['mask']]
@@ -2,25 +2,26 @@ import sys
 
 sys.path.append('..')
 from DbConnector import DbConnector
+from pipeline_utils import median_stages
 
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+def run_query(db=None):
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
 
-    pipeline = [
-        {'$unwind': '$crew'},
+    median_revenue, median_revenue_stages = median_stages(db, '$revenue', 'median_revenue')
 
+    # movie_credits already carries revenue and vote_average, so no $lookup is needed
+    pipeline = [
         {'$match': {'crew.job': 'Director'}},
 
-        {'$lookup': {
-            'from': 'movies',
-            'localField': 'id',
-            'foreignField': 'id',
-            'as': 'movie'
-        }},
+        {'$project': {'crew': 1, 'revenue': 1, 'vote_average': 1}},
+
+        {'$unwind': '$crew'},
 
-        {'$unwind': '$movie'},
+        {'$match': {'crew.job': 'Director'}},
 
         # Group by director
         {'$group': {
@@ -29,36 +30,13 @@ def run_query():
                 'director_name': '$crew.name'
             },
             'movie_count': {'$sum': 1},
-            'revenues': {'$push': '$movie.revenue'},
-            'vote_averages': {'$avg': '$movie.vote_average'}
+            'vote_averages': {'$avg': '$vote_average'},
+            **median_revenue
         }},
 
         {'$match': {'movie_count': {'$gte': 5}}},
 
-        {'$addFields': {
-            'sorted_revenues': {'$sortArray': {'input': '$revenues', 'sortBy': 1}},
-        }},
-
-        {'$addFields': {
-            'median_revenue': {
-                '$let': {
-                    'vars': {
-                        'size': {'$size': '$sorted_revenues'},
-                        'mid': {'$floor': {'$divide': [{'$size': '$sorted_revenues'}, 2]}}
-                    },
-                    'in': {
-                        '$cond': [
-                            {'$eq': [{'$mod': ['$$size', 2]}, 0]},
-                            {'$avg': [
-                                {'$arrayElemAt': ['$sorted_revenues', '$$mid']},
-                                {'$arrayElemAt': ['$sorted_revenues', {'$subtract': ['$$mid', 1]}]}
-                            ]},
-                            {'$arrayElemAt': ['$sorted_revenues', '$$mid']}
-                        ]
-                    }
-                }
-            }
-        }},
+        *median_revenue_stages,
 
         {'$sort': {'median_revenue': -1}},
 
@@ -75,7 +53,7 @@ def run_query():
         }}
     ]
 
-    results = list(db.credits.aggregate(pipeline))
+    results = list(db.movie_credits.aggregate(pipeline, allowDiskUse=True))
 
     print("\n" + "="*80)
     print("Query 1: Top 10 Directors (≥5 movies) with Highest Median Revenue")
@@ -92,7 +70,8 @@ def run_query():
 
     print("="*80 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
     return results
 
 
@@ -2,79 +2,76 @@ import sys
 
 sys.path.append('..')
 from DbConnector import DbConnector
+from pipeline_utils import genre_count, genre_mask_union, load_genres
 
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+def run_query(db=None):
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
 
-    pipeline = [
+    genres = load_genres(db)
+
+    # Distinct genres of the movies a user rated: OR their genre masks and count the bits
+    genre_count_stages = [
+        # movie_genres is keyed by the MovieLens movieId that ratings use
         {'$lookup': {
-            'from': 'movies',
-            'localField': 'movieId',
-            'foreignField': 'id',
-            'as': 'movie'
+            'from': 'movie_genres',
+            'localField': 'movie_ids',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'_id': 0, 'genre_mask': 1}}],
+            'as': 'movie_genres'
         }},
 
-        {'$unwind': '$movie'},
-
-        {'$unwind': {
-            'path': '$movie.genres_list',
-            'preserveNullAndEmptyArrays': True
-        }},
+        {'$project': {
+            '_id': 0,
+            'userId': 1,
+            'ratings_count': 1,
+            'variance': 1,
+            'genre_count': genre_count(db, genre_mask_union(db, '$movie_genres.genre_mask', genres), genres)
+        }}
+    ]
 
+    pipeline = [
+        # One pass over the ratings; nothing is unwound, so each rating counts once
         {'$group': {
             '_id': '$userId',
             'ratings_count': {'$sum': 1},
-            'ratings': {'$push': '$rating'},
-            'genres': {'$addToSet': '$movie.genres_list'}
+            'rating_std': {'$stdDevPop': '$rating'},
+            'movie_ids': {'$addToSet': '$movieId'}
         }},
 
         {'$match': {'ratings_count': {'$gte': 20}}},
 
-        {'$addFields': {
-            'mean_rating': {'$avg': '$ratings'},
-            'genre_count': {'$size': '$genres'}
-        }},
-
-        {'$addFields': {
-            'variance': {
-                '$divide': [
-                    {
-                        '$reduce': {
-                            'input': '$ratings',
-                            'initialValue': 0,
-                            'in': {
-                                '$add': [
-                                    '$$value',
-                                    {'$pow': [
-                                        {'$subtract': ['$$this', '$mean_rating']},
-                                        2
-                                    ]}
-                                ]
-                            }
-                        }
-                    },
-                    '$ratings_count'
-                ]
-            }
-        }},
-
-        # Format output
         {'$project': {
             '_id': 0,
             'userId': '$_id',
             'ratings_count': 1,
-            'variance': {'$round': ['$variance', 4]},
-            'genre_count': 1
+            'variance': {'$round': [{'$pow': ['$rating_std', 2]}, 4]},
+            'movie_ids': 1
+        }},
+
+        # Genres are only looked up for the users each list needs
+        {'$facet': {
+            'genre_diverse': [
+                *genre_count_stages,
+                {'$sort': {'genre_count': -1, 'userId': 1}},
+                {'$limit': 10}
+            ],
+            'high_variance': [
+                {'$sort': {'variance': -1, 'userId': 1}},
+                {'$limit': 10},
+                *genre_count_stages
+            ]
         }}
     ]
 
-    all_users = list(db.ratings.aggregate(pipeline))
+    result = next(db.ratings.aggregate(pipeline, allowDiskUse=True))
 
-    genre_diverse = sorted(all_users, key=lambda x: x['genre_count'], reverse=True)[:10]
+    genre_diverse = result['genre_diverse']
 
-    high_variance = sorted(all_users, key=lambda x: x['variance'], reverse=True)[:10]
+    high_variance = result['high_variance']
 
     print("\n" + "="*100)
     print("Query 10: User Rating Statistics (≥20 ratings)")
@@ -104,7 +101,8 @@ def run_query():
 
     print("="*100 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
 
     return {
         'genre_diverse': genre_diverse,
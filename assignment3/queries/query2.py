@@ -2,67 +2,130 @@ import sys
 
 sys.path.append('..')
 
-from collections import defaultdict
-from itertools import combinations
+from collections import Counter
+from multiprocessing import Pool
 
 from DbConnector import DbConnector
 
+MIN_CO_APPEARANCES = 3
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+# Movie casts for the worker processes, set once per process by _init_worker
+_worker_casts = None
+
+
+def fetch_movie_casts(db, max_order=None, batch_size=None):
+    """
+    Return (vote_average, sorted actor ids) per movie, keeping only actors
+    with at least MIN_CO_APPEARANCES movies, since no pair without them can
+    reach the threshold.
+    """
+    cast_match = {'kind': 'cast'}
+    if max_order is not None:
+        cast_match['order'] = {'$lte': max_order}
 
     pipeline_movies = [
-        {'$lookup': {
-            'from': 'movies',
-            'localField': 'id',
-            'foreignField': 'id',
-            'as': 'movie'
+        {'$match': cast_match},
+        {'$group': {
+            '_id': '$movie_id',
+            'vote_average': {'$first': '$vote_average'},
+            'cast': {'$addToSet': '$person_id'}
         }},
-        {'$unwind': '$movie'},
         {'$project': {
-            'movie_id': '$id',
-            'vote_average': '$movie.vote_average',
-            'cast': {
-                '$map': {
-                    'input': '$cast',
-                    'as': 'actor',
-                    'in': {
-                        'id': '$$actor.id',
-                        'name': '$$actor.name'
-                    }
-                }
-            }
+            '_id': 0,
+            'vote_average': 1,
+            'cast': 1
         }}
     ]
 
-    movies_with_cast = list(db.credits.aggregate(pipeline_movies))
-
-    pair_data = defaultdict(lambda: {'count': 0, 'votes': []})
-
-    for movie in movies_with_cast:
-        cast = movie.get('cast', [])
-        vote_avg = movie.get('vote_average', 0)
+    options = {'batchSize': batch_size} if batch_size else {}
+    movies = [
+        (movie.get('vote_average') or 0, movie['cast'])
+        for movie in db.appearances.aggregate(pipeline_movies, allowDiskUse=True, **options)
+    ]
 
-        for actor1, actor2 in combinations(cast, 2):
-            if actor1['id'] < actor2['id']:
-                pair_key = (actor1['id'], actor1['name'], actor2['id'], actor2['name'])
-            else:
-                pair_key = (actor2['id'], actor2['name'], actor1['id'], actor1['name'])
+    movie_counts = Counter(actor for _, cast in movies for actor in cast)
+    casts = []
+    for vote_avg, cast in movies:
+        frequent = sorted(actor for actor in cast if movie_counts[actor] >= MIN_CO_APPEARANCES)
+        if len(frequent) >= 2:
+            casts.append((vote_avg, frequent))
+    return casts
+
+
+def count_pairs(casts, shard=0, num_shards=1):
+    """
+    Count co-appearances and sum vote_average per actor pair, only for pairs
+    whose first (smaller) actor id falls in the given shard.
+    """
+    pairs = {}
+    for vote_avg, cast in casts:
+        for i, actor1 in enumerate(cast):
+            if actor1 % num_shards != shard:
+                continue
+            for actor2 in cast[i + 1:]:
+                totals = pairs.get((actor1, actor2))
+                if totals is None:
+                    pairs[(actor1, actor2)] = [1, vote_avg]
+                else:
+                    totals[0] += 1
+                    totals[1] += vote_avg
+
+    return {pair: totals for pair, totals in pairs.items() if totals[0] >= MIN_CO_APPEARANCES}
+
+
+def _init_worker(casts):
+    global _worker_casts
+    _worker_casts = casts
+
+
+def _count_shard(args):
+    shard, num_shards = args
+    return count_pairs(_worker_casts, shard, num_shards)
+
+
+def run_query(db=None, max_order=None, num_shards=1, processes=None, batch_size=None):
+    """
+    Args:
+        db: Database handle to use, a new connection is opened and closed if omitted
+        max_order (int): Only consider cast members billed at or above this order
+        num_shards (int): Split the pair space into this many shards, each
+            counted separately to bound the size of a single pair table
+        processes (int): Worker processes for the shards, defaults to one
+            per shard when num_shards > 1
+        batch_size (int): Cursor batch size for the movie casts, defaults to
+            the connector's when the query opens its own connection
+    """
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
+        if batch_size is None:
+            batch_size = db_connector.batch_size
+
+    casts = fetch_movie_casts(db, max_order, batch_size)
+
+    frequent_pairs = {}
+    if num_shards > 1:
+        with Pool(processes or num_shards, initializer=_init_worker, initargs=(casts,)) as pool:
+            for shard_pairs in pool.imap_unordered(_count_shard, [(shard, num_shards) for shard in range(num_shards)]):
+                frequent_pairs.update(shard_pairs)
+    else:
+        frequent_pairs = count_pairs(casts)
 
-            pair_data[pair_key]['count'] += 1
-            pair_data[pair_key]['votes'].append(vote_avg)
+    person_ids = {person_id for pair in frequent_pairs for person_id in pair}
+    names = {
+        person['id']: person.get('name')
+        for person in db.people.find({'id': {'$in': list(person_ids)}}, {'_id': 0, 'id': 1, 'name': 1})
+    }
 
     results = []
-    for (actor1_id, actor1_name, actor2_id, actor2_name), data in pair_data.items():
-        if data['count'] >= 3:
-            avg_vote = sum(data['votes']) / len(data['votes']) if data['votes'] else 0
-            results.append({
-                'actor1': actor1_name,
-                'actor2': actor2_name,
-                'co_appearances': data['count'],
-                'avg_vote_average': round(avg_vote, 2)
-            })
+    for (actor1_id, actor2_id), (count, vote_sum) in frequent_pairs.items():
+        results.append({
+            'actor1': names.get(actor1_id) or 'Unknown',
+            'actor2': names.get(actor2_id) or 'Unknown',
+            'co_appearances': count,
+            'avg_vote_average': round(vote_sum / count, 2)
+        })
 
     results.sort(key=lambda x: (-x['co_appearances'], -x['avg_vote_average']))
 
@@ -81,7 +144,8 @@ def run_query():
 
     print("="*100 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
     return results
 
 
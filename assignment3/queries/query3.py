@@ -2,58 +2,64 @@ import sys
 
 sys.path.append('..')
 from DbConnector import DbConnector
+from pipeline_utils import genre_count, genre_mask_union, genre_names, load_genres
 
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+def run_query(db=None):
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
+
+    genres = load_genres(db)
 
     pipeline = [
-        {'$unwind': '$cast'},
+        {'$match': {'kind': 'cast'}},
 
-        {'$lookup': {
-            'from': 'movies',
-            'localField': 'id',
-            'foreignField': 'id',
-            'as': 'movie'
+        # Group by actor over the narrow appearances collection
+        {'$group': {
+            '_id': '$person_id',
+            'movie_ids': {'$addToSet': '$movie_id'},
+            'genre_masks': {'$addToSet': '$genre_mask'}
         }},
 
-        {'$unwind': '$movie'},
-
-        {'$unwind': '$movie.genres_list'},
+        {'$match': {'movie_ids.9': {'$exists': True}}},
 
-        # Group by actor
-        {'$group': {
-            '_id': {
-                'actor_id': '$cast.id',
-                'actor_name': '$cast.name'
-            },
-            'movie_count': {'$sum': 1},
-            'genres': {'$addToSet': '$movie.genres_list'}
+        # OR the per-movie genre bitmasks instead of building sets of genre names
+        {'$project': {
+            'movie_count': {'$size': '$movie_ids'},
+            'genre_mask': genre_mask_union(db, '$genre_masks', genres)
         }},
 
-        {'$match': {'movie_count': {'$gte': 10}}},
-
         {'$addFields': {
-            'genre_count': {'$size': '$genres'},
-            'example_genres': {'$slice': ['$genres', 5]}
+            'genre_count': genre_count(db, '$genre_mask', genres)
         }},
 
         {'$sort': {'genre_count': -1, 'movie_count': -1}},
 
         {'$limit': 10},
 
+        {'$lookup': {
+            'from': 'people',
+            'localField': '_id',
+            'foreignField': 'id',
+            'pipeline': [{'$project': {'_id': 0, 'name': 1}}],
+            'as': 'person'
+        }},
+
         # Format output
         {'$project': {
             '_id': 0,
-            'actor': '$_id.actor_name',
+            'actor': {'$ifNull': [{'$arrayElemAt': ['$person.name', 0]}, 'Unknown']},
             'movie_count': 1,
             'genre_count': 1,
-            'example_genres': 1
+            'genre_mask': 1
         }}
     ]
 
-    results = list(db.credits.aggregate(pipeline))
+    results = list(db.appearances.aggregate(pipeline))
+    for result in results:
+        result['example_genres'] = genre_names(result.pop('genre_mask'), genres)[:5]
 
     print("\n" + "="*120)
     print("Query 3: Top 10 Actors (≥10 movies) with Widest Genre Breadth")
@@ -71,7 +77,8 @@ def run_query():
 
     print("="*120 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
     return results
 
 
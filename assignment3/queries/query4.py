@@ -2,11 +2,16 @@ import sys
 
 sys.path.append('..')
 from DbConnector import DbConnector
+from pipeline_utils import median_stages
 
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+def run_query(db=None):
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
+
+    median_vote, median_vote_stages = median_stages(db, '$vote_average', 'median_vote_average')
 
     pipeline = [
         {'$match': {
@@ -18,39 +23,14 @@ def run_query():
             '_id': '$belongs_to_collection.name',
             'movie_count': {'$sum': 1},
             'total_revenue': {'$sum': '$revenue'},
-            'vote_averages': {'$push': '$vote_average'},
-            'release_dates': {'$push': '$release_date'}
+            'earliest_date': {'$min': '$release_date'},
+            'latest_date': {'$max': '$release_date'},
+            **median_vote
         }},
 
         {'$match': {'movie_count': {'$gte': 3}}},
 
-        {'$addFields': {
-            'sorted_votes': {'$sortArray': {'input': '$vote_averages', 'sortBy': 1}},
-            'sorted_dates': {'$sortArray': {'input': '$release_dates', 'sortBy': 1}}
-        }},
-
-        {'$addFields': {
-            'median_vote_average': {
-                '$let': {
-                    'vars': {
-                        'size': {'$size': '$sorted_votes'},
-                        'mid': {'$floor': {'$divide': [{'$size': '$sorted_votes'}, 2]}}
-                    },
-                    'in': {
-                        '$cond': [
-                            {'$eq': [{'$mod': ['$$size', 2]}, 0]},
-                            {'$avg': [
-                                {'$arrayElemAt': ['$sorted_votes', '$$mid']},
-                                {'$arrayElemAt': ['$sorted_votes', {'$subtract': ['$$mid', 1]}]}
-                            ]},
-                            {'$arrayElemAt': ['$sorted_votes', '$$mid']}
-                        ]
-                    }
-                }
-            },
-            'earliest_date': {'$arrayElemAt': ['$sorted_dates', 0]},
-            'latest_date': {'$arrayElemAt': ['$sorted_dates', -1]}
-        }},
+        *median_vote_stages,
 
         {'$sort': {'total_revenue': -1}},
 
@@ -65,15 +45,15 @@ def run_query():
             'median_vote_average': {'$round': ['$median_vote_average', 2]},
             'date_range': {
                 '$concat': [
-                    {'$ifNull': ['$earliest_date', 'N/A']},
+                    {'$dateToString': {'date': '$earliest_date', 'format': '%Y-%m-%d', 'onNull': 'N/A'}},
                     ' → ',
-                    {'$ifNull': ['$latest_date', 'N/A']}
+                    {'$dateToString': {'date': '$latest_date', 'format': '%Y-%m-%d', 'onNull': 'N/A'}}
                 ]
             }
         }}
     ]
 
-    results = list(db.movies.aggregate(pipeline))
+    results = list(db.movies.aggregate(pipeline, allowDiskUse=True))
 
     print("\n" + "="*120)
     print("Query 4: Top 10 Film Collections (≥3 movies) with Largest Total Revenue")
@@ -90,7 +70,8 @@ def run_query():
 
     print("="*120 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
     return results
 
 
@@ -2,85 +2,53 @@ import sys
 
 sys.path.append('..')
 from DbConnector import DbConnector
+from pipeline_utils import median_stages
 
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+def run_query(db=None):
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
+
+    median_runtime, median_runtime_stages = median_stages(db, '$runtime', 'median_runtime')
 
     pipeline = [
         {'$match': {
-            'release_date': {'$ne': None, '$exists': True},
+            'decade': {'$ne': None},
             'runtime': {'$ne': None, '$gt': 0},
             'genres_list': {'$exists': True, '$ne': []}
         }},
 
-        # Extract decade from release_date and primary genre
+        # Primary genre; decade is stored on the movie at load time
         {'$addFields': {
-            'year': {
-                '$toInt': {
-                    '$substr': ['$release_date', 0, 4]
-                }
-            },
             'primary_genre': {'$arrayElemAt': ['$genres_list', 0]}
         }},
 
-        {'$addFields': {
-            'decade': {
-                '$concat': [
-                    {'$toString': {'$multiply': [{'$floor': {'$divide': ['$year', 10]}}, 10]}},
-                    's'
-                ]
-            }
-        }},
-
         {'$group': {
             '_id': {
                 'decade': '$decade',
                 'primary_genre': '$primary_genre'
             },
             'movie_count': {'$sum': 1},
-            'runtimes': {'$push': '$runtime'}
+            **median_runtime
         }},
 
-        {'$addFields': {
-            'sorted_runtimes': {'$sortArray': {'input': '$runtimes', 'sortBy': 1}}
-        }},
-
-        {'$addFields': {
-            'median_runtime': {
-                '$let': {
-                    'vars': {
-                        'size': {'$size': '$sorted_runtimes'},
-                        'mid': {'$floor': {'$divide': [{'$size': '$sorted_runtimes'}, 2]}}
-                    },
-                    'in': {
-                        '$cond': [
-                            {'$eq': [{'$mod': ['$$size', 2]}, 0]},
-                            {'$avg': [
-                                {'$arrayElemAt': ['$sorted_runtimes', '$$mid']},
-                                {'$arrayElemAt': ['$sorted_runtimes', {'$subtract': ['$$mid', 1]}]}
-                            ]},
-                            {'$arrayElemAt': ['$sorted_runtimes', '$$mid']}
-                        ]
-                    }
-                }
-            }
-        }},
+        *median_runtime_stages,
 
         {'$sort': {'_id.decade': 1, 'median_runtime': -1}},
 
         # Format output
         {'$project': {
             '_id': 0,
-            'decade': '$_id.decade',
+            'decade': {'$concat': [{'$toString': '$_id.decade'}, 's']},
             'primary_genre': '$_id.primary_genre',
             'movie_count': 1,
             'median_runtime': {'$round': ['$median_runtime', 1]}
         }}
     ]
 
-    results = list(db.movies.aggregate(pipeline))
+    results = list(db.movies.aggregate(pipeline, allowDiskUse=True))
 
     print("\n" + "="*80)
     print("Query 5: Median Runtime and Movie Count by Decade and Primary Genre")
@@ -104,7 +72,8 @@ def run_query():
 
     print("="*80 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
     return results
 
 
@@ -4,24 +4,19 @@ sys.path.append('..')
 from DbConnector import DbConnector
 
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+def run_query(db=None):
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
 
     pipeline = [
-        {'$lookup': {
-            'from': 'movies',
-            'localField': 'id',
-            'foreignField': 'id',
-            'as': 'movie'
-        }},
-
-        {'$unwind': '$movie'},
-
         {'$match': {
-            'movie.release_date': {'$ne': None, '$exists': True}
+            'decade': {'$ne': None}
         }},
 
+        {'$project': {'id': 1, 'cast': 1, 'decade': 1}},
+
         {'$unwind': '$cast'},
 
         {'$match': {
@@ -29,23 +24,6 @@ def run_query():
             'cast.gender': {'$in': [1, 2]}
         }},
 
-        {'$addFields': {
-            'year': {
-                '$toInt': {
-                    '$substr': ['$movie.release_date', 0, 4]
-                }
-            }
-        }},
-
-        {'$addFields': {
-            'decade': {
-                '$concat': [
-                    {'$toString': {'$multiply': [{'$floor': {'$divide': ['$year', 10]}}, 10]}},
-                    's'
-                ]
-            }
-        }},
-
         {'$group': {
             '_id': {
                 'movie_id': '$id',
@@ -76,13 +54,13 @@ def run_query():
         # Format output
         {'$project': {
             '_id': 0,
-            'decade': '$_id',
+            'decade': {'$concat': [{'$toString': '$_id'}, 's']},
             'movie_count': 1,
             'avg_female_proportion': {'$round': ['$avg_female_proportion', 4]}
         }}
     ]
 
-    results = list(db.credits.aggregate(pipeline))
+    results = list(db.movie_credits.aggregate(pipeline))
 
     print("\n" + "="*80)
     print("Query 6: Average Female Proportion in Top 5 Cast by Decade")
@@ -100,7 +78,8 @@ def run_query():
 
     print("="*80 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
     return results
 
 
@@ -4,28 +4,19 @@ sys.path.append('..')
 from DbConnector import DbConnector
 
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+def run_query(db=None):
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
     pipeline = [
+        # Uses the text index over keywords, tagline and overview; 'noir' also
+        # matches 'neo-noir' and 'film noir' since the text index splits on hyphens
         {'$match': {
-            'keywords': {'$elemMatch': {'$regex': 'noir', '$options': 'i'}},
+            '$text': {'$search': 'noir'},
             'vote_count': {'$gte': 50}
         }},
 
-        {'$addFields': {
-            'year': {
-                '$cond': {
-                    'if': {'$and': [
-                        {'$ne': ['$release_date', None]},
-                        {'$gte': [{'$strLenCP': '$release_date'}, 4]}
-                    ]},
-                    'then': {'$substr': ['$release_date', 0, 4]},
-                    'else': 'N/A'
-                }
-            }
-        }},
-
         {'$sort': {'vote_average': -1}},
 
         {'$limit': 20},
@@ -34,7 +25,7 @@ def run_query():
         {'$project': {
             '_id': 0,
             'title': 1,
-            'year': 1,
+            'year': {'$ifNull': [{'$toString': '$release_year'}, 'N/A']},
             'vote_average': {'$round': ['$vote_average', 2]},
             'vote_count': 1,
         }}
@@ -43,7 +34,7 @@ def run_query():
     results = list(db.movies.aggregate(pipeline))
 
     print("\n" + "="*100)
-    print("Query 7: Top 20 'Noir' Movies (vote_count ≥ 50) by Vote Average — matched on keywords")
+    print("Query 7: Top 20 'Noir' Movies (vote_count ≥ 50) by Vote Average — text search on keywords, tagline and overview")
     print("="*100)
 
     if results:
@@ -57,7 +48,8 @@ def run_query():
 
     print("="*100 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
     return results
 
 
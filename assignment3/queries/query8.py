@@ -3,65 +3,188 @@ import sys
 sys.path.append('..')
 from DbConnector import DbConnector
 
+MODES = ('reduced', 'appearances')
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+MIN_COLLABORATIONS = 3
+MIN_VOTE_COUNT = 100
 
-    pipeline = [
-        {'$lookup': {
-            'from': 'movies',
-            'localField': 'id',
-            'foreignField': 'id',
-            'as': 'movie'
+
+# Distinct ids of a movie's directors and cast members
+DIRECTOR_IDS = {'$setUnion': [{
+    '$map': {
+        'input': {'$filter': {
+            'input': {'$ifNull': ['$crew', []]},
+            'cond': {'$eq': ['$$this.job', 'Director']}
         }},
+        'in': '$$this.id'
+    }
+}]}
+
+CAST_IDS = {'$setUnion': [{
+    '$map': {
+        'input': {'$ifNull': ['$cast', []]},
+        'in': '$$this.id'
+    }
+}]}
+
+
+def _qualifying_lookup(ids_field, role, output_field):
+    # query8_people holds the directors and actors with at least MIN_COLLABORATIONS
+    # movies with vote_count >= MIN_VOTE_COUNT; no pair without both of them
+    # qualifies. Equality on an array field matches any element, so one indexed
+    # lookup per movie returns the qualifying people among all of its ids
+    return {'$lookup': {
+        'from': 'query8_people',
+        'localField': ids_field,
+        'foreignField': 'person_id',
+        'pipeline': [
+            {'$match': {'role': role}},
+            {'$project': {'_id': 0, 'person_id': 1}}
+        ],
+        'as': output_field
+    }}
+
+
+def reduced_stages(person_filter=True):
+    """
+    Reduce every qualifying movie to {directors, cast} id arrays before any
+    pairs are formed, so only the small per-movie arrays are unwound.
+    """
+    stages = [
+        {'$match': {'vote_count': {'$gte': MIN_VOTE_COUNT}, 'crew.job': 'Director'}},
 
-        {'$unwind': '$movie'},
+        {'$project': {
+            '_id': 0,
+            'vote_average': 1,
+            'revenue': 1,
+            'directors': DIRECTOR_IDS,
+            'cast': CAST_IDS
+        }}
+    ]
 
-        {'$match': {
-            'movie.vote_count': {'$gte': 100}
-        }},
+    if person_filter:
+        # query8_people is built by setup_mongodb.py alongside movie_credits
+        stages += [
+            _qualifying_lookup('directors', 'director', 'directors'),
+            _qualifying_lookup('cast', 'actor', 'cast'),
+            {'$set': {'directors': '$directors.person_id', 'cast': '$cast.person_id'}}
+        ]
 
-        {'$unwind': '$crew'},
-        {'$match': {'crew.job': 'Director'}},
+    return stages + [
+        {'$match': {'directors.0': {'$exists': True}, 'cast.0': {'$exists': True}}},
 
-        {'$addFields': {
-            'director': '$crew'
-        }},
+        {'$unwind': '$directors'},
 
         {'$unwind': '$cast'},
 
-        # Group by director-actor pair
         {'$group': {
             '_id': {
-                'director_id': '$director.id',
-                'director_name': '$director.name',
-                'actor_id': '$cast.id',
-                'actor_name': '$cast.name'
+                'director_id': '$directors',
+                'actor_id': '$cast'
             },
             'collaboration_count': {'$sum': 1},
-            'avg_vote_average': {'$avg': '$movie.vote_average'},
-            'avg_revenue': {'$avg': '$movie.revenue'}
+            'avg_vote_average': {'$avg': '$vote_average'},
+            'avg_revenue': {'$avg': '$revenue'}
+        }}
+    ]
+
+
+def appearances_stages():
+    return [
+        # appearances carries the movie's vote_count, vote_average and revenue
+        {'$match': {'kind': 'crew', 'job': 'Director', 'vote_count': {'$gte': MIN_VOTE_COUNT}}},
+
+        # One row per director and movie, even with several Director credits
+        {'$group': {
+            '_id': {'person_id': '$person_id', 'movie_id': '$movie_id'},
+            'vote_average': {'$first': '$vote_average'},
+            'revenue': {'$first': '$revenue'}
         }},
 
-        {'$match': {'collaboration_count': {'$gte': 3}}},
+        # Distinct cast of the same movie through the (movie_id, kind, order) index
+        {'$lookup': {
+            'from': 'appearances',
+            'localField': '_id.movie_id',
+            'foreignField': 'movie_id',
+            'pipeline': [
+                {'$match': {'kind': 'cast'}},
+                {'$group': {'_id': '$person_id'}}
+            ],
+            'as': 'cast'
+        }},
+
+        {'$unwind': '$cast'},
+
+        # Group by director-actor pair; each pair now counts a film once
+        {'$group': {
+            '_id': {
+                'director_id': '$_id.person_id',
+                'actor_id': '$cast._id'
+            },
+            'collaboration_count': {'$sum': 1},
+            'avg_vote_average': {'$avg': '$vote_average'},
+            'avg_revenue': {'$avg': '$revenue'}
+        }}
+    ]
+
+
+def run_query(db=None, mode='reduced', person_filter=True):
+    """
+    mode 'reduced' pairs directors and cast within movie_credits documents,
+    'appearances' joins director and cast appearances. person_filter only
+    applies to the reduced mode. A new connection is opened and closed
+    unless a db handle is passed in.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
+
+    if mode == 'reduced':
+        collection = db.movie_credits
+        pipeline = reduced_stages(person_filter)
+    else:
+        collection = db.appearances
+        pipeline = appearances_stages()
+
+    pipeline += [
+        {'$match': {'collaboration_count': {'$gte': MIN_COLLABORATIONS}}},
 
         {'$sort': {'avg_vote_average': -1}},
 
         {'$limit': 20},
 
+        {'$lookup': {
+            'from': 'people',
+            'localField': '_id.director_id',
+            'foreignField': 'id',
+            'pipeline': [{'$project': {'_id': 0, 'name': 1}}],
+            'as': 'director'
+        }},
+
+        {'$lookup': {
+            'from': 'people',
+            'localField': '_id.actor_id',
+            'foreignField': 'id',
+            'pipeline': [{'$project': {'_id': 0, 'name': 1}}],
+            'as': 'actor'
+        }},
+
         # Format output
         {'$project': {
             '_id': 0,
-            'director': '$_id.director_name',
-            'actor': '$_id.actor_name',
+            'director': {'$ifNull': [{'$arrayElemAt': ['$director.name', 0]}, 'Unknown']},
+            'actor': {'$ifNull': [{'$arrayElemAt': ['$actor.name', 0]}, 'Unknown']},
             'films_count': '$collaboration_count',
             'mean_vote_average': {'$round': ['$avg_vote_average', 2]},
             'mean_revenue': {'$round': ['$avg_revenue', 2]}
         }}
     ]
 
-    results = list(db.credits.aggregate(pipeline))
+    results = list(collection.aggregate(pipeline, allowDiskUse=True))
 
     print("\n" + "="*120)
     print("Query 8: Top 20 Director-Actor Pairs (≥3 Collaborations, vote_count ≥100)")
@@ -79,7 +202,8 @@ def run_query():
 
     print("="*120 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
     return results
 
 
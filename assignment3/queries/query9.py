@@ -4,19 +4,23 @@ sys.path.append('..')
 from DbConnector import DbConnector
 
 
-def run_query():
-    db_connector = DbConnector(DATABASE='assignment3')
-    db = db_connector.db
+def run_query(db=None):
+    db_connector = None
+    if db is None:
+        db_connector = DbConnector(DATABASE='assignment3')
+        db = db_connector.db
 
     pipeline = [
+        # is_us_production is derived at load time from the countries and companies
         {'$match': {
-            'original_language': {'$ne': 'en', '$exists': True},
-            '$or': [
-                {'production_companies.name': {'$regex': 'United States', '$options': 'i'}},
-                {'production_countries.name': 'United States of America'}
-            ]
+            'is_us_production': True,
+            'original_language': {'$nin': ['en', None]}
         }},
 
+        # Only indexed fields are needed, so the index on
+        # (is_us_production, original_language, title) covers the query
+        {'$project': {'_id': 0, 'original_language': 1, 'title': 1}},
+
         {'$group': {
             '_id': '$original_language',
             'count': {'$sum': 1},
@@ -54,7 +58,8 @@ def run_query():
 
     print("="*100 + "\n")
 
-    db_connector.close_connection()
+    if db_connector is not None:
+        db_connector.close_connection()
     return results
 
 
@@ -1,4 +1,16 @@
+import argparse
+import io
+import sys
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from tabulate import tabulate
+
+sys.path.append('..')
+from DbConnector import DbConnector
 
 import query1
 import query2
@@ -11,34 +23,108 @@ import query8
 import query9
 import query10
 
+QUERIES = {
+    1: query1.run_query,
+    2: query2.run_query,
+    3: query3.run_query,
+    4: query4.run_query,
+    5: query5.run_query,
+    6: query6.run_query,
+    7: query7.run_query,
+    8: query8.run_query,
+    9: query9.run_query,
+    10: query10.run_query
+}
+
+
+class ThreadLocalStdout:
+    """
+    Stand-in for sys.stdout that sends the writes of a capturing thread to
+    that thread's own buffer, so concurrent queries don't interleave output.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self):
+        self._local.buffer = io.StringIO()
+
+    def release(self):
+        output = self._local.buffer.getvalue()
+        del self._local.buffer
+        return output
+
+    def write(self, text):
+        return getattr(self._local, 'buffer', self._stream).write(text)
+
+    def flush(self):
+        getattr(self._local, 'buffer', self._stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def run_captured(stdout, number, query_func, db):
+    stdout.capture()
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        query_func(db)
+    except Exception as e:
+        traceback.print_exc(file=sys.stdout)
+        status = f"failed: {e.__class__.__name__}"
+    seconds = time.perf_counter() - start
+    return {'query': number, 'status': status, 'seconds': seconds, 'output': stdout.release()}
+
 
 def main():
+    parser = argparse.ArgumentParser(description='Run the assignment 3 queries on one shared connection')
+    parser.add_argument('queries', nargs='*', type=int, default=list(QUERIES),
+                        help='Query numbers to run (default: all)')
+    parser.add_argument('-w', '--workers', type=int, default=len(QUERIES),
+                        help='Number of queries to run at the same time')
+    args = parser.parse_args()
+
     print("\n" + "="*100)
     print("RUNNING ALL QUERIES FOR ASSIGNMENT 3")
     print("="*100 + "\n")
 
-    queries = [
-        query1.run_query,
-        query2.run_query,
-        query3.run_query,
-        query4.run_query,
-        query5.run_query,
-        query6.run_query,
-        query7.run_query,
-        query8.run_query,
-        query9.run_query,
-        query10.run_query
-    ]
-
-    for query_func in queries:
-        try:
-            query_func()
-        except Exception:
-            traceback.print_exc()
+    # MongoClient is thread-safe, so every query shares this client's connection pool
+    db_connector = DbConnector(DATABASE='assignment3')
+
+    # Query 2 streams many documents back, so it uses the shared connector's batch size
+    queries = dict(QUERIES)
+    queries[2] = partial(query2.run_query, batch_size=db_connector.batch_size)
+
+    stdout = ThreadLocalStdout(sys.stdout)
+    sys.stdout = stdout
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = [
+                executor.submit(run_captured, stdout, number, queries[number], db_connector.db)
+                for number in args.queries
+            ]
+            # Print in query order; each output appears as soon as its predecessors are done
+            results = []
+            for future in futures:
+                result = future.result()
+                results.append(result)
+                print(result['output'], end='')
+    finally:
+        sys.stdout = stdout._stream
+    total_seconds = time.perf_counter() - start
+
+    db_connector.close_connection()
+
+    table = [[f"Query {result['query']}", result['status'], f"{result['seconds']:.2f}"] for result in results]
 
     print("\n" + "="*100)
     print("ALL QUERIES COMPLETED")
-    print("="*100 + "\n")
+    print("="*100)
+    print(tabulate(table, headers=['Query', 'Status', 'Wall time (s)'], tablefmt='grid'))
+    print(f"Total wall time: {total_seconds:.2f}s\n")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,215 @@
+"""
+Shared helpers for reading ratings.csv.
+
+Ratings are read with compact dtypes (int32 ids and timestamps, float16
+ratings), optionally through a memory-mapped binary cache. The per-movieId
+ratings aggregate is computed once in a chunked pass and cached on disk,
+keyed by a hash of the source file, so every script that needs vote
+statistics can reuse it instead of grouping all ratings again.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = Path('data/cache')
+
+# Bump when the aggregate columns change, so older cached pickles are not reused
+AGGREGATE_VERSION = 2
+
+# Half-star ratings (0.5 - 5.0) are exact in float16, and the timestamps in
+# the dataset fit in int32. Sums over float16 overflow quickly, so upcast the
+# rating column before aggregating it.
+RATINGS_DTYPES = {
+    'userId': 'int32',
+    'movieId': 'int32',
+    'rating': 'float16',
+    'timestamp': 'int32',
+}
+
+# Used when a file has missing values, which the plain integer dtypes can't hold
+NULLABLE_RATINGS_DTYPES = {
+    'userId': 'Int32',
+    'movieId': 'Int32',
+    'rating': 'Float32',
+    'timestamp': 'Int32',
+}
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Return the SHA-1 hex digest of a file, read in blocks.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _dtypes_for(columns):
+    return {col: dtype for col, dtype in RATINGS_DTYPES.items() if col in columns}
+
+
+def _nullable_dtypes_for(columns):
+    return {col: dtype for col, dtype in NULLABLE_RATINGS_DTYPES.items() if col in columns}
+
+
+def read_ratings(path='data/movies/ratings.csv', usecols=None, cache=False, cache_dir=CACHE_DIR, verbose=True):
+    """
+    Read a ratings CSV file with compact dtypes.
+
+    Args:
+        path (str): Path to the ratings CSV file
+        usecols (list): Columns to read, defaults to all of them
+        cache (bool): Whether to use the memory-mapped binary cache
+        cache_dir (str): Directory holding the binary cache
+        verbose (bool): Whether to print loading messages
+
+    Returns:
+        pandas.DataFrame: Ratings with the dtypes in RATINGS_DTYPES, or
+        NULLABLE_RATINGS_DTYPES if the file has missing values.
+        Frames loaded from the cache are backed by read-only memory maps.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Ratings file not found: {path}")
+
+    if cache:
+        cache_path = Path(cache_dir) / f"{path.stem}_{file_hash(path)[:16]}"
+        df = _read_binary_cache(cache_path, usecols)
+        if df is not None:
+            if verbose:
+                print(f"Loaded {len(df):,} ratings from binary cache {cache_path}")
+            return df
+
+    columns = usecols if usecols is not None else pd.read_csv(path, nrows=0).columns.tolist()
+    try:
+        df = pd.read_csv(path, usecols=usecols, dtype=_dtypes_for(columns))
+    except ValueError:
+        if verbose:
+            print("Ratings contain missing values, falling back to nullable dtypes")
+        return pd.read_csv(path, usecols=usecols, dtype=_nullable_dtypes_for(columns))
+
+    if cache and usecols is None:
+        try:
+            _write_binary_cache(cache_path, df)
+            if verbose:
+                print(f"Ratings cached to {cache_path}")
+        except Exception as e:
+            if verbose:
+                print(f"Warning: Could not save ratings cache: {e}")
+
+    return df
+
+
+def iter_ratings(path='data/movies/ratings.csv', chunksize=1_000_000, usecols=None):
+    """
+    Iterate over a ratings CSV file in chunks with compact dtypes.
+
+    Chunks use the nullable dtypes so missing values don't abort the stream.
+    """
+    columns = usecols if usecols is not None else pd.read_csv(path, nrows=0).columns.tolist()
+    return pd.read_csv(path, usecols=usecols, dtype=_nullable_dtypes_for(columns), chunksize=chunksize)
+
+
+def _write_binary_cache(cache_path, df):
+    cache_path.mkdir(parents=True, exist_ok=True)
+    for col in df.columns:
+        np.save(cache_path / f"{col}.npy", df[col].to_numpy())
+    # Written last, so an interrupted write is never picked up as a cache hit
+    with open(cache_path / 'columns.json', 'w') as f:
+        json.dump(list(df.columns), f)
+
+
+def _read_binary_cache(cache_path, usecols=None):
+    manifest = cache_path / 'columns.json'
+    if not manifest.exists():
+        return None
+    with open(manifest) as f:
+        columns = json.load(f)
+    if usecols is not None:
+        columns = [col for col in columns if col in usecols]
+    return pd.DataFrame(
+        {col: np.load(cache_path / f"{col}.npy", mmap_mode='r') for col in columns},
+        copy=False
+    )
+
+
+def compute_ratings_aggregate(path, chunksize=2_000_000, verbose=True):
+    """
+    Stream ratings.csv in chunks and aggregate per movieId.
+
+    Returns:
+        pandas.DataFrame indexed by movieId with the columns count, sum,
+        sum_sq, min_timestamp and max_timestamp.
+    """
+    partials = []
+    rows = 0
+    for chunk in iter_ratings(path, chunksize=chunksize, usecols=['movieId', 'rating', 'timestamp']):
+        chunk['rating'] = chunk['rating'].astype('float64')
+        chunk['rating_sq'] = chunk['rating'] ** 2
+        partials.append(chunk.groupby('movieId').agg(
+            count=('rating', 'count'),
+            sum=('rating', 'sum'),
+            sum_sq=('rating_sq', 'sum'),
+            min_timestamp=('timestamp', 'min'),
+            max_timestamp=('timestamp', 'max'),
+        ))
+        rows += len(chunk)
+        if verbose:
+            print(f"  Aggregated {rows:,} ratings...")
+
+    if not partials:
+        return pd.DataFrame(columns=['count', 'sum', 'sum_sq', 'min_timestamp', 'max_timestamp'])
+
+    return pd.concat(partials).groupby(level=0).agg({
+        'count': 'sum',
+        'sum': 'sum',
+        'sum_sq': 'sum',
+        'min_timestamp': 'min',
+        'max_timestamp': 'max',
+    })
+
+
+def load_ratings_aggregate(path='data/movies/ratings.csv', cache_dir=CACHE_DIR, verbose=True):
+    """
+    Load the per-movieId ratings aggregate, computing and caching it if needed.
+
+    Args:
+        path (str): Path to the ratings CSV file
+        cache_dir (str): Directory holding the cached aggregates
+        verbose (bool): Whether to print loading messages
+
+    Returns:
+        pandas.DataFrame: See compute_ratings_aggregate
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Ratings file not found: {path}")
+
+    cache_dir = Path(cache_dir)
+    cache_path = cache_dir / f"{path.stem}_aggregate_v{AGGREGATE_VERSION}_{file_hash(path)[:16]}.pkl"
+
+    if cache_path.exists():
+        if verbose:
+            print(f"Loading cached ratings aggregate from {cache_path}")
+        return pd.read_pickle(cache_path)
+
+    if verbose:
+        print(f"Computing ratings aggregate from {path}...")
+    aggregate = compute_ratings_aggregate(path, verbose=verbose)
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        aggregate.to_pickle(cache_path)
+        if verbose:
+            print(f"Ratings aggregate cached to {cache_path}")
+    except Exception as e:
+        if verbose:
+            print(f"Warning: Could not save ratings aggregate cache: {e}")
+
+    return aggregate
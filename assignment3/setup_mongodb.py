@@ -1,8 +1,9 @@
 import ast
 
 import pandas as pd
-from DbConnector import DbConnector
-from pymongo import ASCENDING, DESCENDING
+from DbConnector import DbConnector, block_compression_options
+from pymongo import ASCENDING, DESCENDING, TEXT
+from ratings_io import read_ratings
 from tqdm import tqdm
 
 
@@ -10,10 +11,13 @@ def create_collections():
     db_connector = DbConnector(DATABASE='assignment3')
     db = db_connector.db
 
+    # The large collections are stored with the configured block compressor (zstd by default)
+    compression = block_compression_options(db_connector.block_compressor)
+
     print("Creating collections in 'assignment3' database...\n")
 
     existing_collections = db.list_collection_names()
-    for collection in ['movies', 'people', 'credits', 'ratings']:
+    for collection in ['movies', 'people', 'credits', 'ratings', 'movie_credits', 'appearances', 'query8_people', 'movie_genres', 'genres']:
         if collection in existing_collections:
             db[collection].drop()
             print(f"Dropped existing collection: {collection}")
@@ -36,6 +40,7 @@ def create_collections():
                 'budget': {'bsonType': ['int', 'long', 'double', 'string']},
                 'genres': {'bsonType': ['array', 'string', 'null']},
                 'genres_list': {'bsonType': ['array', 'string', 'null']},
+                'genre_mask': {'bsonType': ['int', 'long'], 'description': 'Bitmask of genres, see the genres collection'},
                 'homepage': {'bsonType': ['string', 'null']},
                 'imdb_id': {'bsonType': ['string', 'null']},
                 'original_language': {'bsonType': ['string', 'null']},
@@ -45,7 +50,11 @@ def create_collections():
                 'poster_path': {'bsonType': ['string', 'null']},
                 'production_companies': {'bsonType': ['array', 'string', 'null']},
                 'production_countries': {'bsonType': ['array', 'string', 'null']},
-                'release_date': {'bsonType': ['string', 'date', 'null']},
+                'production_country_codes': {'bsonType': 'array', 'description': 'ISO 3166-1 codes of production_countries'},
+                'is_us_production': {'bsonType': 'bool', 'description': 'US production country or company'},
+                'release_date': {'bsonType': ['date', 'null']},
+                'release_year': {'bsonType': ['int', 'long', 'null'], 'description': 'Year of release_date'},
+                'decade': {'bsonType': ['int', 'long', 'null'], 'description': 'release_year rounded down to 10'},
                 'revenue': {'bsonType': ['int', 'long', 'double', 'string']},
                 'runtime': {'bsonType': ['double', 'string', 'null']},
                 'spoken_languages': {'bsonType': ['array', 'string', 'null']},
@@ -56,7 +65,8 @@ def create_collections():
                 'vote_average': {'bsonType': ['double', 'string']},
                 'vote_count': {'bsonType': ['int', 'long', 'double', 'string']},
                 'keywords': {'bsonType': ['array', 'string', 'null']},
-                'tmdbId': {'bsonType': ['int', 'long', 'double', 'string', 'null'], 'description': 'TMDb ID from links'}
+                'tmdbId': {'bsonType': ['int', 'long', 'double', 'string', 'null'], 'description': 'TMDb ID from links'},
+                'movieIds': {'bsonType': 'array', 'description': 'MovieLens ids (ratings.movieId) from links'}
             }
         }
     }
@@ -65,8 +75,21 @@ def create_collections():
     db.movies.create_index([('id', ASCENDING)], unique=True)
     db.movies.create_index([('title', ASCENDING)])
     db.movies.create_index([('release_date', DESCENDING)])
+    db.movies.create_index([('release_year', ASCENDING)])
+    db.movies.create_index([('decade', ASCENDING)])
+    # Weighted text index for word searches; a keyword hit counts most, the overview least
+    db.movies.create_index(
+        [('keywords', TEXT), ('tagline', TEXT), ('overview', TEXT)],
+        weights={'keywords': 10, 'tagline': 5, 'overview': 1},
+        default_language='english',
+        name='movies_text'
+    )
     db.movies.create_index([('vote_average', DESCENDING)])
     db.movies.create_index([('tmdbId', ASCENDING)])
+    db.movies.create_index([('movieIds', ASCENDING)])
+    # title lets language slices of US productions be answered from the index alone
+    db.movies.create_index([('is_us_production', ASCENDING), ('original_language', ASCENDING), ('title', ASCENDING)])
+    db.movies.create_index([('production_country_codes', ASCENDING)])
 
     people_validator = {
         '$jsonSchema': {
@@ -136,7 +159,7 @@ def create_collections():
         }
     }
 
-    db.create_collection('credits', validator=credits_validator)
+    db.create_collection('credits', validator=credits_validator, **compression)
     db.credits.create_index([('id', ASCENDING)], unique=True)
     db.credits.create_index([('cast.id', ASCENDING)])
     db.credits.create_index([('crew.id', ASCENDING)])
@@ -166,13 +189,39 @@ def create_collections():
         }
     }
 
-    db.create_collection('ratings', validator=ratings_validator)
+    db.create_collection('ratings', validator=ratings_validator, **compression)
     db.ratings.create_index([('userId', ASCENDING), ('movieId', ASCENDING)])
     db.ratings.create_index([('movieId', ASCENDING)])
     db.ratings.create_index([('userId', ASCENDING)])
     db.ratings.create_index([('rating', DESCENDING)])
     db.ratings.create_index([('timestamp', DESCENDING)])
 
+    # Credits joined with the movie fields the queries need, built by build_movie_credits
+    db.create_collection('movie_credits', **compression)
+    db.movie_credits.create_index([('id', ASCENDING)], unique=True)
+    db.movie_credits.create_index([('crew.job', ASCENDING)])
+    db.movie_credits.create_index([('vote_count', DESCENDING)])
+    db.movie_credits.create_index([('release_year', ASCENDING)])
+    db.movie_credits.create_index([('decade', ASCENDING)])
+
+    # One narrow document per cast/crew credit, built by build_appearances
+    db.create_collection('appearances', **compression)
+    db.appearances.create_index([('kind', ASCENDING), ('person_id', ASCENDING), ('movie_id', ASCENDING)])
+    db.appearances.create_index([('movie_id', ASCENDING), ('kind', ASCENDING), ('order', ASCENDING)])
+    db.appearances.create_index([('kind', ASCENDING), ('job', ASCENDING), ('person_id', ASCENDING)])
+
+    # Directors and actors that can be in a query 8 pair, built by build_query8_people
+    db.create_collection('query8_people')
+    db.query8_people.create_index([('person_id', ASCENDING), ('role', ASCENDING)])
+
+    # MovieLens movieId -> genres map keyed by _id, built by build_movie_genres
+    db.create_collection('movie_genres')
+
+    # Genre name -> bit in genre_mask, filled by load_movies
+    db.create_collection('genres')
+    db.genres.create_index([('name', ASCENDING)], unique=True)
+    db.genres.create_index([('bit', ASCENDING)], unique=True)
+
     print("\n" + "="*50)
     print("Collection creation completed!")
     print("="*50 + "\n")
@@ -180,7 +229,7 @@ def create_collections():
     # Print collection stats
     print("Collection Statistics:")
     print("-" * 50)
-    for collection_name in ['movies', 'people', 'credits', 'ratings']:
+    for collection_name in ['movies', 'people', 'credits', 'ratings', 'movie_credits', 'appearances', 'query8_people', 'movie_genres', 'genres']:
         collection = db[collection_name]
         count = collection.count_documents({})
         indexes = collection.index_information()
@@ -204,6 +253,68 @@ def safe_eval(val):
         return val
 
 
+def extract_keyword_names(raw_kw):
+    parsed = safe_eval(raw_kw) if pd.notna(raw_kw) else None
+
+    if isinstance(parsed, list):
+        names = []
+        for it in parsed:
+            if isinstance(it, dict):
+                name = it.get('name')
+                if name:
+                    names.append(name)
+            elif isinstance(it, str):
+                names.append(it)
+        return names
+    if isinstance(parsed, dict):
+        name = parsed.get('name')
+        return [name] if name else []
+    if isinstance(parsed, str):
+        return [parsed]
+    return []
+
+
+def build_genre_bits(genres_lists):
+    """
+    Assign each distinct genre name a bit, in alphabetical order.
+
+    Returns:
+        dict: genre name -> bit index
+    """
+    names = sorted({name for genres in genres_lists if isinstance(genres, list) for name in genres})
+    if len(names) > 63:
+        raise ValueError(f"Found {len(names)} genres, but genre_mask only has room for 63")
+    return {name: bit for bit, name in enumerate(names)}
+
+
+def genre_mask(genres, genre_bits):
+    if not isinstance(genres, list):
+        return 0
+    mask = 0
+    for name in genres:
+        mask |= 1 << genre_bits[name]
+    return mask
+
+
+def country_codes(countries):
+    if not isinstance(countries, list):
+        return []
+    codes = {country.get('iso_3166_1') for country in countries if isinstance(country, dict)}
+    return sorted(code.upper() for code in codes if code)
+
+
+def is_us_production(companies, codes):
+    if 'US' in codes:
+        return True
+    # Some companies carry the country in their name, e.g. "United States Pictures"
+    if not isinstance(companies, list):
+        return False
+    return any(
+        isinstance(company, dict) and 'united states' in str(company.get('name', '')).lower()
+        for company in companies
+    )
+
+
 def load_movies(db):
     print("\n" + "="*60)
     print("Loading movies...")
@@ -214,15 +325,19 @@ def load_movies(db):
     print("Loading links data to merge tmdbId...")
     links_df = pd.read_csv('data/movies_cleaned/links_cleaned.csv')
 
-    tmdb_mapping = {}
-    for _, row in links_df.iterrows():
-        movie_id = int(row['movieId']) if pd.notna(row['movieId']) else None
-        tmdb_id = int(row['tmdbId']) if pd.notna(row['tmdbId']) and row['tmdbId'] != '' else None
-        if movie_id and tmdb_id:
-            tmdb_mapping[movie_id] = tmdb_id
+    links_df['movieId'] = pd.to_numeric(links_df['movieId'], errors='coerce')
+    links_df['tmdbId'] = pd.to_numeric(links_df['tmdbId'], errors='coerce')
+    links_df = links_df.dropna(subset=['movieId', 'tmdbId'])
+    links_df = links_df.astype({'movieId': 'int64', 'tmdbId': 'int64'})
+    links_df = links_df[(links_df['movieId'] != 0) & (links_df['tmdbId'] != 0)]
+    # movieId -> tmdbId, later rows win like the previous dict-based mapping
+    tmdb_mapping = links_df.drop_duplicates(subset=['movieId'], keep='last').set_index('movieId')['tmdbId']
 
     print(f"Loaded {len(tmdb_mapping)} tmdbId mappings from links")
 
+    # tmdbId -> MovieLens movieIds, so ratings can be matched to movies
+    movie_ids_by_tmdb = tmdb_mapping.reset_index().groupby('tmdbId')['movieId'].agg(list)
+
     print("Loading keywords data to merge keywords (using links mapping for ID alignment)...")
 
     try:
@@ -232,52 +347,30 @@ def load_movies(db):
         print(f"Could not load keywords file 'data/movies/keywords.csv': {e}")
         keywords_df = pd.DataFrame()
 
-    tmdb_to_movieid = {v: k for k, v in tmdb_mapping.items()}
-
-    keywords_by_tmdb = {}
-    keywords_by_movieid = {}
-
-    if not keywords_df.empty:
-        for _, krow in keywords_df.iterrows():
-            try:
-                kid_raw = krow.get('id')
-                if pd.isna(kid_raw) or kid_raw == '':
-                    continue
-                kid = int(kid_raw)
-            except Exception:
-                continue
-
-            raw_kw = krow.get('keywords') if 'keywords' in keywords_df.columns else None
-            raw_kw_parsed = safe_eval(raw_kw) if pd.notna(raw_kw) else None
-
-            names = []
-            if isinstance(raw_kw_parsed, list):
-                for it in raw_kw_parsed:
-                    if isinstance(it, dict):
-                        name = it.get('name')
-                        if name:
-                            names.append(name)
-                    elif isinstance(it, str):
-                        names.append(it)
-            elif isinstance(raw_kw_parsed, dict):
-                name = raw_kw_parsed.get('name') if raw_kw_parsed else None
-                if name:
-                    names.append(name)
-            elif isinstance(raw_kw_parsed, str):
-                names.append(raw_kw_parsed)
-
-            if kid in tmdb_to_movieid:
-                keywords_by_tmdb[kid] = names
-                keywords_by_movieid[tmdb_to_movieid[kid]] = names
-            elif kid in tmdb_mapping:
-                tmdb = tmdb_mapping.get(kid)
-                if tmdb:
-                    keywords_by_movieid[kid] = names
-                    keywords_by_tmdb[tmdb] = names
-            else:
-                keywords_by_tmdb[kid] = names
-
-    print(f"Prepared keywords_by_tmdb entries: {len(keywords_by_tmdb)}; keywords_by_movieid entries: {len(keywords_by_movieid)}")
+    keywords_by_tmdb = pd.DataFrame({
+        'tmdb_key': pd.Series(dtype='int64'),
+        'keyword_names': pd.Series(dtype=object)
+    })
+
+    if not keywords_df.empty and 'id' in keywords_df.columns:
+        kid = pd.to_numeric(keywords_df['id'], errors='coerce')
+        keywords_df = keywords_df[kid.notna()].copy()
+        kid = kid[kid.notna()].astype('int64')
+
+        # keywords.csv ids are TMDb ids; ids that are only known as a movieId
+        # are translated through links, anything else is kept as is
+        mapped = kid.map(tmdb_mapping)
+        is_tmdb_id = kid.isin(tmdb_mapping.values)
+        keywords_df['tmdb_key'] = kid.where(is_tmdb_id | mapped.isna(), mapped).astype('int64')
+
+        if 'keywords' in keywords_df.columns:
+            keywords_df['keyword_names'] = keywords_df['keywords'].map(extract_keyword_names)
+        else:
+            keywords_df['keyword_names'] = [[] for _ in range(len(keywords_df))]
+
+        keywords_by_tmdb = keywords_df.drop_duplicates(subset=['tmdb_key'], keep='last')[['tmdb_key', 'keyword_names']]
+
+    print(f"Prepared keywords_by_tmdb entries: {len(keywords_by_tmdb)}")
 
     initial_count = len(df)
     duplicate_ids = df[df.duplicated(subset=['id'], keep='first')]['id'].tolist()
@@ -316,39 +409,63 @@ def load_movies(db):
     if duplicates_removed > 0:
         print(f"\n Removed {duplicates_removed} duplicate entries (keeping first occurrence)\n")
 
-    movies = []
-    seen_ids = set()
-
-    for _, row in tqdm(df.iterrows(), total=len(df), desc="Processing movies"):
-        movie_id = int(row['id']) if pd.notna(row['id']) else None
-
-        if movie_id is None or movie_id in seen_ids:
-            continue
-
-        seen_ids.add(movie_id)
-
-        movie = {
-            'id': movie_id,
-            'belongs_to_collection': safe_eval(row['belongs_to_collection']),
-            'budget': int(row['budget']) if pd.notna(row['budget']) and row['budget'] != '' else 0,
-            'genres': safe_eval(row['genres']),
-            'genres_list': safe_eval(row['genres_list']),
-            'imdb_id': row['imdb_id'] if pd.notna(row['imdb_id']) else None,
-            'original_language': row['original_language'] if pd.notna(row['original_language']) else None,
-            'production_companies': safe_eval(row['production_companies']),
-            'production_countries': safe_eval(row['production_countries']),
-            'release_date': row['release_date'] if pd.notna(row['release_date']) else None,
-            'revenue': int(row['revenue']) if pd.notna(row['revenue']) and row['revenue'] != '' else 0,
-            'runtime': float(row['runtime']) if pd.notna(row['runtime']) and row['runtime'] != '' else None,
-            'spoken_languages': safe_eval(row['spoken_languages']),
-            'title': row['title'] if pd.notna(row['title']) else '',
-            'vote_average': float(row['vote_average']) if pd.notna(row['vote_average']) else 0.0,
-            'vote_count': int(row['vote_count']) if pd.notna(row['vote_count']) else 0,
-            # Prefer keywords_by_tmdb lookup since movies metadata 'id' is TMDb ID
-            'keywords': keywords_by_tmdb.get(movie_id, []),
-        }
+    df['id'] = pd.to_numeric(df['id'], errors='coerce')
+    df = df.dropna(subset=['id'])
+    df['id'] = df['id'].astype('int64')
+    df = df.drop_duplicates(subset=['id'], keep='first')
 
-        movies.append(movie)
+    # Movies metadata 'id' is the TMDb ID, so keywords join directly on it
+    df = df.merge(keywords_by_tmdb, how='left', left_on='id', right_on='tmdb_key')
+
+    genres_lists = df['genres_list'].map(safe_eval)
+    genre_bits = build_genre_bits(genres_lists)
+    print(f"Assigned bits to {len(genre_bits)} genres")
+
+    # Dates become BSON dates; year and decade are stored so queries don't parse strings
+    release_dates = pd.to_datetime(df['release_date'], errors='coerce')
+    release_years = release_dates.dt.year.astype('Int64')
+
+    production_companies = df['production_companies'].map(safe_eval)
+    production_countries = df['production_countries'].map(safe_eval)
+    production_country_codes = production_countries.map(country_codes)
+
+    print("Building movie documents...")
+    movies_df = pd.DataFrame({
+        'id': df['id'],
+        'belongs_to_collection': df['belongs_to_collection'].map(safe_eval),
+        'budget': pd.to_numeric(df['budget'], errors='coerce').fillna(0).astype('int64'),
+        'genres': df['genres'].map(safe_eval),
+        'genres_list': genres_lists,
+        'genre_mask': genres_lists.map(lambda genres: genre_mask(genres, genre_bits)).astype('int64'),
+        'imdb_id': df['imdb_id'],
+        'original_language': df['original_language'],
+        # Cleaned files written before overview/tagline were kept don't have them
+        'overview': df.get('overview'),
+        'production_companies': production_companies,
+        'production_countries': production_countries,
+        'production_country_codes': production_country_codes,
+        'is_us_production': [
+            is_us_production(companies, codes)
+            for companies, codes in zip(production_companies, production_country_codes)
+        ],
+        'release_date': release_dates,
+        'release_year': release_years,
+        'decade': release_years // 10 * 10,
+        'revenue': pd.to_numeric(df['revenue'], errors='coerce').fillna(0).astype('int64'),
+        'runtime': pd.to_numeric(df['runtime'], errors='coerce'),
+        'spoken_languages': df['spoken_languages'].map(safe_eval),
+        'tagline': df.get('tagline'),
+        'title': df['title'].fillna(''),
+        'vote_average': pd.to_numeric(df['vote_average'], errors='coerce').fillna(0.0),
+        'vote_count': pd.to_numeric(df['vote_count'], errors='coerce').fillna(0).astype('int64'),
+        'keywords': [names if isinstance(names, list) else [] for names in df['keyword_names']],
+        'movieIds': [ids if isinstance(ids, list) else [] for ids in df['id'].map(movie_ids_by_tmdb)],
+    })
+
+    # Object dtype gives native Python values for BSON, and NaN becomes None
+    movies_df = movies_df.astype(object)
+    movies_df = movies_df.where(movies_df.notna(), None)
+    movies = movies_df.to_dict('records')
 
     if movies:
         result = db.movies.insert_many(movies, ordered=False)
@@ -356,6 +473,13 @@ def load_movies(db):
     else:
         print("No movies to insert")
 
+    if genre_bits:
+        db.genres.insert_many([
+            {'bit': bit, 'mask': 1 << bit, 'name': name}
+            for name, bit in genre_bits.items()
+        ])
+        print(f" Inserted {len(genre_bits)} genres")
+
 
 def load_credits(db):
     print("\n" + "="*60)
@@ -401,6 +525,9 @@ def load_credits(db):
 
     credits = []
     seen_ids = set()
+    # People are collected in the same pass so the credits collection never
+    # has to be read back from MongoDB to build the people collection
+    people_dict = {}
 
     for _, row in tqdm(df.iterrows(), total=len(df), desc="Processing credits"):
         credit_id = int(row['id']) if pd.notna(row['id']) else None
@@ -416,6 +543,7 @@ def load_credits(db):
             'crew': safe_eval(row['crew']) if pd.notna(row['crew']) else []
         }
 
+        collect_people(credit, people_dict)
         credits.append(credit)
 
     if credits:
@@ -424,36 +552,28 @@ def load_credits(db):
     else:
         print(" No credits to insert")
 
+    return people_dict
 
-def load_people(db):
-    print("\n" + "="*60)
-    print("Extracting people from credits...")
-    print("="*60)
 
-    credits = list(db.credits.find())
+def collect_people(credit, people_dict):
+    # First occurrence wins, cast before crew, matching insertion order
+    for members in (credit.get('cast'), credit.get('crew')):
+        if not isinstance(members, list):
+            continue
+        for person in members:
+            person_id = person.get('id')
+            if person_id and person_id not in people_dict:
+                people_dict[person_id] = {
+                    'id': person_id,
+                    'name': person.get('name'),
+                    'gender': person.get('gender')
+                }
 
-    people_dict = {}
 
-    for credit in tqdm(credits, desc="Processing credits for people"):
-        if credit.get('cast'):
-            for person in credit['cast']:
-                person_id = person.get('id')
-                if person_id and person_id not in people_dict:
-                    people_dict[person_id] = {
-                        'id': person_id,
-                        'name': person.get('name'),
-                        'gender': person.get('gender')
-                    }
-
-        if credit.get('crew'):
-            for person in credit['crew']:
-                person_id = person.get('id')
-                if person_id and person_id not in people_dict:
-                    people_dict[person_id] = {
-                        'id': person_id,
-                        'name': person.get('name'),
-                        'gender': person.get('gender')
-                    }
+def load_people(db, people_dict):
+    print("\n" + "="*60)
+    print("Inserting people collected from credits...")
+    print("="*60)
 
     people = list(people_dict.values())
 
@@ -464,20 +584,235 @@ def load_people(db):
         print(" No people to insert")
 
 
-def load_ratings(db, sample_size=None):
+def build_movie_credits(db, movie_ids=None):
+    print("\n" + "="*60)
+    print("Building denormalized movie_credits...")
+    print("="*60)
+
+    pipeline = []
+    if movie_ids is not None:
+        # Refresh only the given movies, e.g. after updating some of them
+        pipeline.append({'$match': {'id': {'$in': list(movie_ids)}}})
+
+    pipeline += [
+        # Only copy the movie fields that end up in movie_credits
+        {'$lookup': {
+            'from': 'movies',
+            'localField': 'id',
+            'foreignField': 'id',
+            'pipeline': [
+                {'$project': {
+                    '_id': 0,
+                    'vote_average': 1,
+                    'vote_count': 1,
+                    'revenue': 1,
+                    'release_year': 1,
+                    'decade': 1,
+                    'genres_list': 1,
+                    'genre_mask': 1
+                }}
+            ],
+            'as': 'movie'
+        }},
+
+        {'$unwind': '$movie'},
+
+        {'$project': {
+            '_id': 0,
+            'id': 1,
+            'cast': 1,
+            'crew': 1,
+            'vote_average': '$movie.vote_average',
+            'vote_count': '$movie.vote_count',
+            'revenue': '$movie.revenue',
+            'release_year': '$movie.release_year',
+            'decade': '$movie.decade',
+            'genres_list': '$movie.genres_list',
+            'genre_mask': '$movie.genre_mask'
+        }},
+
+        {'$merge': {
+            'into': 'movie_credits',
+            'on': 'id',
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ]
+
+    db.credits.aggregate(pipeline, allowDiskUse=True)
+
+    # $merge never deletes, so drop the documents whose credit or movie is gone
+    id_filter = {} if movie_ids is None else {'id': {'$in': list(movie_ids)}}
+    valid_ids = set(db.credits.distinct('id', id_filter)) & set(db.movies.distinct('id', id_filter))
+    if movie_ids is None:
+        stale_filter = {'id': {'$nin': list(valid_ids)}}
+    else:
+        stale_filter = {'id': {'$in': list(set(movie_ids) - valid_ids)}}
+    deleted = db.movie_credits.delete_many(stale_filter).deleted_count
+    print(f" movie_credits now holds {db.movie_credits.count_documents({})} documents ({deleted} stale removed)")
+
+    # appearances is built from movie_credits, so refresh the same movies there;
+    # the query 8 counts span all movies, so query8_people is rebuilt in full
+    build_appearances(db, movie_ids)
+    build_query8_people(db)
+
+
+def build_appearances(db, movie_ids=None):
+    print("\n" + "="*60)
+    print("Building appearances (person -> movie edges)...")
+    print("="*60)
+
+    pipeline = []
+    if movie_ids is not None:
+        # Replace only the edges of the given movies
+        movie_ids = list(movie_ids)
+        db.appearances.delete_many({'movie_id': {'$in': movie_ids}})
+        pipeline.append({'$match': {'id': {'$in': movie_ids}}})
+
+    # Built from movie_credits, so every edge carries the movie fields the
+    # queries need and they don't have to join movies again
+    pipeline += [
+        {'$project': {
+            '_id': 0,
+            'appearances': {'$concatArrays': [
+                {'$map': {
+                    'input': {'$ifNull': ['$cast', []]},
+                    'as': 'person',
+                    'in': {
+                        'person_id': '$$person.id',
+                        'movie_id': '$id',
+                        'kind': 'cast',
+                        'order': '$$person.order',
+                        'gender': '$$person.gender',
+                        'vote_average': '$vote_average',
+                        'vote_count': '$vote_count',
+                        'revenue': '$revenue',
+                        'genre_mask': '$genre_mask'
+                    }
+                }},
+                {'$map': {
+                    'input': {'$ifNull': ['$crew', []]},
+                    'as': 'person',
+                    'in': {
+                        'person_id': '$$person.id',
+                        'movie_id': '$id',
+                        'kind': 'crew',
+                        'job': '$$person.job',
+                        'gender': '$$person.gender',
+                        'vote_average': '$vote_average',
+                        'vote_count': '$vote_count',
+                        'revenue': '$revenue',
+                        'genre_mask': '$genre_mask'
+                    }
+                }}
+            ]}
+        }},
+
+        {'$unwind': '$appearances'},
+
+        {'$replaceRoot': {'newRoot': '$appearances'}},
+
+        {'$match': {'person_id': {'$ne': None}}}
+    ]
+
+    if movie_ids is None:
+        # $out replaces the collection but keeps the indexes from create_collections
+        pipeline.append({'$out': 'appearances'})
+    else:
+        pipeline.append({'$merge': {'into': 'appearances', 'whenNotMatched': 'insert'}})
+
+    db.movie_credits.aggregate(pipeline, allowDiskUse=True)
+    print(f" appearances now holds {db.appearances.count_documents({})} documents")
+
+
+def build_query8_people(db, min_movies=3, min_vote_count=100):
+    print("\n" + "="*60)
+    print("Building query8_people (qualifying directors and actors)...")
+    print("="*60)
+
+    # A director-actor pair needs min_movies movies with vote_count >= min_vote_count,
+    # so only people with that many such movies themselves can be in one
+    pipeline = [
+        {'$match': {'vote_count': {'$gte': min_vote_count}}},
+
+        {'$project': {
+            '_id': 0,
+            'people': {'$concatArrays': [
+                {'$map': {
+                    'input': {'$setUnion': [{'$map': {
+                        'input': {'$filter': {
+                            'input': {'$ifNull': ['$crew', []]},
+                            'cond': {'$eq': ['$$this.job', 'Director']}
+                        }},
+                        'in': '$$this.id'
+                    }}]},
+                    'in': {'person_id': '$$this', 'role': 'director'}
+                }},
+                {'$map': {
+                    'input': {'$setUnion': [{'$map': {
+                        'input': {'$ifNull': ['$cast', []]},
+                        'in': '$$this.id'
+                    }}]},
+                    'in': {'person_id': '$$this', 'role': 'actor'}
+                }}
+            ]}
+        }},
+
+        {'$unwind': '$people'},
+
+        {'$group': {'_id': '$people', 'movie_count': {'$sum': 1}}},
+
+        {'$match': {'movie_count': {'$gte': min_movies}}},
+
+        {'$project': {'_id': 0, 'person_id': '$_id.person_id', 'role': '$_id.role'}},
+
+        # $out replaces the collection but keeps the indexes from create_collections
+        {'$out': 'query8_people'}
+    ]
+
+    db.movie_credits.aggregate(pipeline, allowDiskUse=True)
+    print(f" query8_people now holds {db.query8_people.count_documents({})} documents")
+
+
+def build_movie_genres(db):
+    print("\n" + "="*60)
+    print("Building movie_genres (MovieLens movieId -> genres map)...")
+    print("="*60)
+
+    # Keyed by the MovieLens movieId, the id ratings use; links maps every
+    # movieId to a single movie, so the ids are unique
+    pipeline = [
+        {'$match': {'genres_list.0': {'$exists': True}, 'movieIds.0': {'$exists': True}}},
+
+        {'$unwind': '$movieIds'},
+
+        {'$project': {
+            '_id': '$movieIds',
+            'movie_id': '$id',
+            'genres': '$genres_list',
+            'genre_mask': 1
+        }},
+
+        {'$out': 'movie_genres'}
+    ]
+
+    db.movies.aggregate(pipeline, allowDiskUse=True)
+    print(f" movie_genres now holds {db.movie_genres.count_documents({})} documents")
+
+
+def load_ratings(db, sample_size=None, batch_size=10000):
     print("\n" + "="*60)
     print("Loading ratings...")
     if sample_size:
         print(f"(Sampling {sample_size} records for faster testing)")
     print("="*60)
 
-    df = pd.read_csv('data/movies_cleaned/ratings_cleaned.csv')
+    df = read_ratings('data/movies_cleaned/ratings_cleaned.csv')
 
     if sample_size:
         df = df.sample(n=min(sample_size, len(df)))
 
     ratings = []
-    batch_size = 10000
 
     for i in tqdm(range(0, len(df), batch_size), desc="Processing ratings in batches"):
         batch = df.iloc[i:i+batch_size]
@@ -513,8 +848,11 @@ def load_all_data(db_connector):
 
     try:
         load_movies(db)
-        load_credits(db)
-        load_people(db)
+        people_dict = load_credits(db)
+        load_people(db, people_dict)
+        # Also builds appearances and query8_people from the new movie_credits
+        build_movie_credits(db)
+        build_movie_genres(db)
 
         print("\n" + "="*60)
         print("Ratings file can be very large!")
@@ -525,9 +863,9 @@ def load_all_data(db_connector):
         choice = input("Enter choice (1/2/3): ").strip()
 
         if choice == '1':
-            load_ratings(db)
+            load_ratings(db, batch_size=db_connector.batch_size)
         elif choice == '2':
-            load_ratings(db, sample_size=10000)
+            load_ratings(db, sample_size=10000, batch_size=db_connector.batch_size)
         else:
             print("Skipping ratings...")
 
@@ -537,6 +875,10 @@ def load_all_data(db_connector):
         print(f"Movies:   {db.movies.count_documents({})}")
         print(f"Credits:  {db.credits.count_documents({})}")
         print(f"People:   {db.people.count_documents({})}")
+        print(f"Movie credits: {db.movie_credits.count_documents({})}")
+        print(f"Appearances: {db.appearances.count_documents({})}")
+        print(f"Movie genres: {db.movie_genres.count_documents({})}")
+        print(f"Genres:   {db.genres.count_documents({})}")
         print(f"Ratings:  {db.ratings.count_documents({})}")
         print("="*60)
 